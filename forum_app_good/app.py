@@ -1,28 +1,51 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, redirect, url_for, flash, abort
+from flask import (
+    Blueprint, Flask, render_template, request, redirect, url_for, flash, abort, jsonify,
+    get_template_attribute, current_app
+)
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import os
+import argparse
+import json
+import click
 from datetime import datetime
-from flask_migrate import Migrate
+from functools import partial
+from sqlalchemy.ext.hybrid import hybrid_property
+import config
+import search
+import dbconfig
+from querycount import QueryCounter, QueryBudgetExceeded
+from viewcounter import ViewCounter
+from pagination import encode_cursor, keyset_paginate
+import queryplan
+from pagecache import PageCache
+from ratelimit import RateLimiter
+from usercache import UserCache, CachedUser
+from metrics import RequestMetrics
+from httpcache import HttpCache
+from jobs import JobQueue
+import images
+import facets
+import serializers
+import storage
 
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'database.db')
-app.config['SECRET_KEY'] = 'ваш_секретный_ключ'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
-
 db = SQLAlchemy()
-db.init_app(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+sqlite_tuning = dbconfig.SQLiteTuning()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+request_metrics = RequestMetrics()
+query_counter = QueryCounter()
+page_cache = PageCache()
+rate_limiter = RateLimiter()
+uploads = storage.StreamingUploads()
+http_cache = HttpCache()
+job_queue = JobQueue()
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Страницы, API и команды CLI; подключаются к приложению в create_app
+bp = Blueprint('main', __name__, cli_group=None)
 
 class User(UserMixin, db.Model):
     """Модель пользователя системы"""
@@ -63,9 +86,37 @@ class Post(db.Model):
     price = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     views = db.Column(db.Integer, default=0)
+    # Денормализованные поля: обновляются вместе с добавлением и удалением комментариев
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime, nullable=True)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
     images = db.relationship('Image', backref='post', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # Главная лента: сортировка по дате
+        db.Index('ix_post_created_at', 'created_at'),
+        # Форум и торговая площадка: фильтр по разделу + сортировка по дате
+        db.Index('ix_post_section_created_at', 'section', 'created_at'),
+        # Профиль: посты пользователя по дате
+        db.Index('ix_post_user_id_created_at', 'user_id', 'created_at'),
+        # Торговая площадка: диапазон цен внутри раздела
+        db.Index('ix_post_section_price', 'section', 'price'),
+        # Торговая площадка: сортировка по просмотрам
+        db.Index('ix_post_section_views', 'section', 'views'),
+        # Форум: сортировка по последней активности, в том числе внутри раздела
+        db.Index('ix_post_last_activity', db.func.coalesce(last_comment_at, created_at), 'id'),
+        db.Index('ix_post_section_last_activity', 'section', db.func.coalesce(last_comment_at, created_at), 'id'),
+    )
+
+    @hybrid_property
+    def last_activity_at(self):
+        """Время последней активности: последний комментарий или создание поста"""
+        return self.last_comment_at or self.created_at
+
+    @last_activity_at.expression
+    def last_activity_at(cls):
+        return db.func.coalesce(cls.last_comment_at, cls.created_at)
+
 class Image(db.Model):
     """Модель изображения, прикрепленного к посту"""
     id = db.Column(db.Integer, primary_key=True)
@@ -73,6 +124,12 @@ class Image(db.Model):
     order = db.Column(db.Integer, default=0)
     size = db.Column(db.String(20), default='medium')
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    # Варианты small/medium/large созданы фоновым конвейером
+    processed = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    __table_args__ = (
+        db.Index('ix_image_post_id_order', 'post_id', 'order'),
+    )
 
 class Comment(db.Model):
     """Модель комментария к посту"""
@@ -83,6 +140,74 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_comment_post_id_created_at', 'post_id', 'created_at'),
+    )
+
+view_counter = ViewCounter(db=db, model=Post)
+
+def finish_image_processing(filename, ok):
+    """Обработка результата фонового конвейера изображений
+    
+    Успешно обработанные изображения отмечаются как готовые. У отклонённых
+    удаляются только ещё не обработанные записи, а файл — лишь когда на
+    него не осталось ссылок: уже проверенные записи других постов не
+    трогаются. Страницы постов с этим изображением удаляются из кеша.
+    
+    Args:
+        filename (str): Имя файла изображения
+        ok (bool): Успешна ли обработка
+    """
+    rows = Image.query.filter_by(filename=filename, processed=False).all()
+    for image in rows:
+        if ok:
+            image.processed = True
+        else:
+            db.session.delete(image)
+    db.session.commit()
+    if not ok and db.session.query(Image.id).filter_by(filename=filename).first() is None:
+        remove_upload(filename)
+    page_cache.invalidate(*{f'post:{image.post_id}' for image in rows})
+
+image_pipeline = images.ImagePipeline(on_done=finish_image_processing)
+
+@db.event.listens_for(Post, 'after_insert')
+def index_new_post(mapper, connection, target):
+    """Добавление нового поста в поисковый индекс"""
+    search.index_post(connection, target.id, target.title, target.content)
+
+@db.event.listens_for(Post, 'after_update')
+def reindex_post(mapper, connection, target):
+    """Обновление поста в поисковом индексе при изменении заголовка или текста"""
+    state = db.inspect(target)
+    if state.attrs.title.history.has_changes() or state.attrs.content.history.has_changes():
+        search.index_post(connection, target.id, target.title, target.content)
+
+@db.event.listens_for(Post, 'after_delete')
+def unindex_post(mapper, connection, target):
+    """Удаление поста из поискового индекса"""
+    search.remove_post(connection, target.id)
+
+def load_user_record(user_id):
+    """Загрузка лёгкой записи пользователя из БД
+    
+    Args:
+        user_id (int): ID пользователя
+        
+    Returns:
+        CachedUser: Запись пользователя или None если не найден
+    """
+    row = db.session.query(User.id, User.username).filter_by(id=user_id).first()
+    return CachedUser(row.id, row.username) if row else None
+
+user_cache = UserCache(loader=load_user_record)
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """Сброс кешированной записи при изменении или удалении пользователя"""
+    user_cache.invalidate(target.id)
+
 @login_manager.user_loader
 def load_user(user_id):
     """Загрузка пользователя для Flask-Login
@@ -91,33 +216,340 @@ def load_user(user_id):
         user_id (int): ID пользователя
         
     Returns:
-        User: Объект пользователя или None если не найден
+        CachedUser: Запись пользователя или None если не найден
+    """
+    try:
+        return user_cache.get(int(user_id))
+    except ValueError:
+        return None
+
+def post_query(*relations):
+    """Запрос постов с жадной загрузкой связей, нужных шаблону
+    
+    Args:
+        *relations (str): Имена связей: 'author', 'images', 'comments',
+            'comments.author'
+        
+    Returns:
+        Query: Запрос по модели Post с опциями загрузки
+    """
+    loaders = {
+        'author': lambda: db.joinedload(Post.author),
+        'images': lambda: db.selectinload(Post.images),
+        'comments': lambda: db.selectinload(Post.comments),
+        'comments.author': lambda: db.selectinload(Post.comments).joinedload(Comment.author),
+    }
+    return Post.query.options(*[loaders[name]() for name in relations])
+
+def feed_page(query, per_page, sort='created_at'):
+    """Курсорная страница ленты постов по параметрам after/before запроса
+    
+    Args:
+        query: Запрос постов без сортировки
+        per_page (int): Количество постов на странице
+        sort (str): Атрибут Post для сортировки ('created_at' или 'last_activity_at')
+        
+    Returns:
+        KeysetPagination: Страница ленты
+    """
+    return keyset_paginate(
+        query, Post, per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        count_ttl=current_app.config['FEED_COUNT_TTL'],
+        sort=sort
+    )
+
+def feed_tags(*sections):
+    """Теги кеша лент, в которые попадают посты указанных разделов
+    
+    Args:
+        *sections (str): Разделы постов
+        
+    Returns:
+        set: Теги страниц-лент
+    """
+    tags = {'feed:index'}
+    for section in sections:
+        tags.add('feed:marketplace' if section == 'marketplace' else 'feed:forum')
+    return tags
+
+def tag_posts(feed, posts):
+    """Пометка кешируемой страницы тегами ленты и показанных на ней постов
+    
+    Args:
+        feed (str): Имя ленты ('index', 'forum', 'marketplace')
+        posts (list): Посты на странице
     """
-    return User.query.get(int(user_id))
+    page_cache.tag(f'feed:{feed}', *[f'post:{post.id}' for post in posts])
 
-def allowed_file(filename):
-    """Проверка разрешенных расширений файлов
+def count_new_comment(comment):
+    """Увеличение счётчика комментариев поста в текущей транзакции
     
     Args:
-        filename (str): Имя файла
+        comment (Comment): Добавленный комментарий с заполненным created_at
+    """
+    Post.query.filter_by(id=comment.post_id).update({
+        'comment_count': Post.comment_count + 1,
+        'last_comment_at': comment.created_at
+    }, synchronize_session=False)
+
+def recount_comments(post_id):
+    """Пересчёт comment_count и last_comment_at поста по таблице комментариев
+    
+    Args:
+        post_id (int): ID поста
+    """
+    db.session.flush()
+    comments = db.session.query(Comment).filter(Comment.post_id == post_id)
+    Post.query.filter_by(id=post_id).update({
+        'comment_count': comments.with_entities(db.func.count(Comment.id)).scalar_subquery(),
+        'last_comment_at': comments.with_entities(db.func.max(Comment.created_at)).scalar_subquery()
+    }, synchronize_session=False)
+
+def comment_page(post_id, after=None):
+    """Страница комментариев поста от новых к старым с авторами
+    
+    Args:
+        post_id (int): ID поста
+        after (str, optional): Курсор — вернуть комментарии старше него
         
     Returns:
-        bool: True если расширение разрешено, иначе False
+        KeysetPagination: Страница комментариев
     """
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    query = Comment.query.options(db.joinedload(Comment.author)).filter_by(post_id=post_id)
+    return keyset_paginate(query, Comment, current_app.config['COMMENTS_PER_PAGE'], after=after)
 
-@app.route('/')
+# Сортировки торговой площадки; каждая опирается на индекс по (section, колонка).
+# Товары без цены — в конце при обеих сортировках по цене (по убыванию SQLite и так ставит NULL последними)
+MARKETPLACE_SORTS = {
+    'new': (Post.created_at.desc(), Post.id.desc()),
+    'price_asc': (Post.price.asc().nulls_last(), Post.id.asc()),
+    'price_desc': (Post.price.desc(), Post.id.desc()),
+    'views': (Post.views.desc(), Post.id.desc()),
+}
+
+def marketplace_filters():
+    """Фильтры торговой площадки из параметров запроса
+    
+    Returns:
+        dict: search, min_price, max_price, price (ключ ценового диапазона),
+        seller (ID продавца) и has_images (True/False/None)
+    """
+    price = request.args.get('price', '')
+    if price != facets.NO_PRICE and facets.bucket_range(price) is None:
+        price = ''
+    return {
+        'search': request.args.get('search', ''),
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'price': price,
+        'seller': request.args.get('seller', type=int),
+        'has_images': {'1': True, '0': False}.get(request.args.get('has_images')),
+    }
+
+def apply_marketplace_filters(query, filters, exclude=()):
+    """Применение фильтров торговой площадки к запросу постов
+    
+    Args:
+        query: Запрос постов раздела marketplace
+        filters (dict): Фильтры из marketplace_filters
+        exclude (tuple): Фильтры, которые нужно пропустить ('price', 'seller', 'has_images')
+        
+    Returns:
+        Query: Запрос с фильтрами
+    """
+    if filters['search']:
+        query = search.apply_search(query, Post, filters['search'], columns=('title',))
+    if 'price' not in exclude:
+        if filters['min_price'] is not None:
+            query = query.filter(Post.price >= filters['min_price'])
+        if filters['max_price'] is not None:
+            query = query.filter(Post.price <= filters['max_price'])
+        if filters['price'] == facets.NO_PRICE:
+            query = query.filter(Post.price.is_(None))
+        elif filters['price']:
+            low, high = facets.bucket_range(filters['price'])
+            query = query.filter(Post.price >= low)
+            if high is not None:
+                query = query.filter(Post.price < high)
+    if filters['seller'] and 'seller' not in exclude:
+        query = query.filter(Post.user_id == filters['seller'])
+    if filters['has_images'] is not None and 'has_images' not in exclude:
+        with_images = facets.has_images(Post, Image)
+        query = query.filter(with_images if filters['has_images'] else ~with_images)
+    return query
+
+def recent_comments(posts, limit=3):
+    """Последние комментарии для списка постов одним запросом
+    
+    Args:
+        posts (list): Посты
+        limit (int): Количество комментариев на пост
+        
+    Returns:
+        dict: ID поста -> список комментариев от новых к старым
+    """
+    post_ids = [post.id for post in posts if post.comment_count]
+    if not post_ids:
+        return {}
+    rank = db.func.row_number().over(
+        partition_by=Comment.post_id,
+        order_by=(Comment.created_at.desc(), Comment.id.desc())
+    ).label('rank')
+    ranked = db.session.query(Comment.id, rank).filter(Comment.post_id.in_(post_ids)).subquery()
+    comments = Comment.query.options(db.joinedload(Comment.author)).join(
+        ranked, ranked.c.id == Comment.id
+    ).filter(ranked.c.rank <= limit).order_by(Comment.created_at.desc(), Comment.id.desc())
+    result = {}
+    for comment in comments:
+        result.setdefault(comment.post_id, []).append(comment)
+    return result
+
+def store_image(file, post_id, order=0):
+    """Сохранение загруженного изображения в хранилище и добавление записи Image
+    
+    Одинаковые файлы хранятся один раз: запись ссылается на уже
+    существующий файл, и если он обработан, повторная обработка не нужна.
+    
+    Args:
+        file (FileStorage): Загруженный файл
+        post_id (int): ID поста
+        order (int): Порядковый номер изображения в посте
+        
+    Returns:
+        str: Путь к файлу, который нужно отправить в конвейер обработки, или None
+        
+    Raises:
+        storage.InvalidUpload: Если содержимое не является изображением допустимого формата
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    filename = storage.save_upload(file.stream, folder, current_app.config['ALLOWED_EXTENSIONS'])
+    processed = db.session.query(Image.id).filter_by(filename=filename, processed=True).first() is not None
+    db.session.add(Image(filename=filename, order=order, post_id=post_id, processed=processed))
+    return None if processed else os.path.join(folder, filename)
+
+def store_images(files, post_id, start=0):
+    """Сохранение загруженных изображений поста
+    
+    Файлы, содержимое которых не является изображением допустимого
+    формата, пропускаются с предупреждением.
+    
+    Args:
+        files (list): Загруженные файлы
+        post_id (int): ID поста
+        start (int): Порядковый номер первого изображения
+        
+    Returns:
+        list: Пути файлов, которые нужно отправить в конвейер обработки, без повторов
+    """
+    uploaded = []
+    for i, file in enumerate(f for f in files if f):
+        try:
+            pending = store_image(file, post_id, order=start + i)
+        except storage.InvalidUpload:
+            flash(f'Файл {file.filename} не является изображением и пропущен', 'error')
+            continue
+        # Одинаковые файлы в одном запросе — один путь в хранилище, обрабатывать его нужно один раз
+        if pending and pending not in uploaded:
+            uploaded.append(pending)
+    return uploaded
+
+@job_queue.task('release_uploads')
+def release_uploads(filenames):
+    """Удаление файлов, на которые больше не ссылается ни одна запись Image
+    
+    Выполняется фоновой задачей после удаления поста; повторный запуск безопасен.
+    
+    Args:
+        filenames (iterable): Имена файлов удалённых изображений
+    """
+    for filename in filenames:
+        if Image.query.filter_by(filename=filename).first() is None:
+            remove_upload(filename)
+
+def remove_upload(filename):
+    """Удаление загруженного файла и всех его вариантов
+    
+    Args:
+        filename (str): Имя исходного файла
+    """
+    for name in [filename] + images.variant_filenames(filename):
+        try:
+            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], name))
+        except OSError:
+            pass
+
+@bp.app_template_global()
+def image_url(image, size=None, extension='jpg'):
+    """URL изображения нужного варианта размера
+    
+    Args:
+        image (Image): Изображение поста
+        size (str, optional): Вариант размера; по умолчанию image.size
+        extension (str): Формат варианта ('jpg' или 'webp')
+        
+    Returns:
+        str: URL варианта или исходного файла, если варианты ещё не готовы
+    """
+    if not image.processed:
+        return url_for('static', filename='uploads/' + image.filename)
+    size = size if size in images.VARIANTS else image.size
+    if size not in images.VARIANTS:
+        size = 'medium'
+    return url_for('static', filename='uploads/' + images.variant_filename(image.filename, size, extension))
+
+@bp.app_template_global()
+def image_srcset(image, extension='jpg'):
+    """Значение атрибута srcset со всеми вариантами изображения
+    
+    Args:
+        image (Image): Изображение поста
+        extension (str): Формат вариантов ('jpg' или 'webp')
+        
+    Returns:
+        str: srcset или пустая строка, если варианты ещё не готовы
+    """
+    if not image.processed:
+        return ''
+    return ', '.join(
+        f'{image_url(image, size, extension)} {width}w' for size, width in images.VARIANTS.items()
+    )
+
+@bp.app_errorhandler(429)
+def too_many_requests(e):
+    """Страница превышения лимита частоты запросов
+    
+    Returns:
+        Response: HTML-страница с кодом 429 и заголовком Retry-After
+    """
+    return render_template('429.html', retry_after=e.retry_after), 429, {'Retry-After': str(e.retry_after)}
+
+@bp.app_errorhandler(413)
+def request_too_large(e):
+    """Обработка слишком большого запроса с загрузками
+    
+    Returns:
+        Response: Перенаправление обратно на форму
+    """
+    limit = current_app.config['UPLOAD_MAX_FILE_SIZE'] // (1024 * 1024)
+    flash(f'Слишком большой запрос: не более {current_app.config["UPLOAD_MAX_FILES"]} файлов до {limit} МБ каждый', 'error')
+    return redirect(request.referrer or url_for('main.index'))
+
+@bp.route('/')
+@page_cache.cached()
 def index():
     """Главная страница с последними постами
     
     Returns:
         Response: HTML-страница с пагинированным списком постов
     """
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.created_at.desc()).paginate(page=page, per_page=10)
+    posts = feed_page(post_query('author'), per_page=10)
+    tag_posts('index', posts.items)
     return render_template('index.html', posts=posts)
 
-@app.route('/post/<int:post_id>')
+@bp.route('/post/<int:post_id>')
+@page_cache.cached(on_hit=lambda post_id: view_counter.hit(post_id))
 def post_detail(post_id):
     """Страница просмотра поста с комментариями
     
@@ -127,13 +559,190 @@ def post_detail(post_id):
     Returns:
         Response: HTML-страница с деталями поста
     """
-    post = Post.query.get_or_404(post_id)
-    post.views = post.views + 1 if post.views else 1
-    db.session.commit()
-    return render_template('post_detail.html', post=post)
+    post = post_query('author').filter_by(id=post_id).first_or_404()
+    view_counter.hit(post.id)
+    page_cache.tag(f'post:{post.id}')
+    comments = comment_page(post.id, request.args.get('comments_after'))
+    return render_template('post_detail.html', post=post, comments=comments)
 
-@app.route('/post/<int:post_id>/comment', methods=['POST'])
+@bp.route('/post/<int:post_id>/comments')
+@page_cache.cached()
+def post_comments(post_id):
+    """Следующая страница комментариев поста в JSON
+    
+    Args:
+        post_id (int): ID поста
+        
+    Returns:
+        Response: JSON с комментариями (от новых к старым), их HTML и курсором следующей страницы
+    """
+    comments = comment_page(post_id, request.args.get('after'))
+    page_cache.tag(f'post:{post_id}')
+    render_comment = get_template_attribute('comments.html', 'render_comment')
+    return jsonify({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created_at': comment.created_at.isoformat(),
+                'html': str(render_comment(comment, current_user)),
+            }
+            for comment in comments.items
+        ],
+        'next_cursor': comments.next_cursor,
+    })
+
+def api_error(message, status=400):
+    """Ответ API с ошибкой в JSON
+    
+    Args:
+        message (str): Описание ошибки
+        status (int): HTTP-статус
+        
+    Returns:
+        tuple: JSON-ответ и статус
+    """
+    return jsonify({'error': message}), status
+
+def api_limit(default, maximum):
+    """Размер страницы из параметра limit в пределах [1, maximum]"""
+    return max(1, min(request.args.get('limit', default, type=int), maximum))
+
+def api_post_json(post, embed, content=False, comments=None):
+    """Сериализация поста для API с URL изображений приложения"""
+    return serializers.post_json(
+        post, embed, content=content, image_url=image_url, image_srcset=image_srcset, comments=comments
+    )
+
+@bp.route('/api/v1/posts')
+@page_cache.cached()
+def api_posts():
+    """Лента постов в JSON с курсорной пагинацией
+    
+    Параметры запроса: section (раздел или 'forum' — все, кроме торговой
+    площадки), search, after/before (курсоры), limit, embed ('author', 'images').
+    Результаты поиска тоже отсортированы по дате, а не по релевантности.
+    
+    Returns:
+        Response: JSON {'items': [...], 'next_cursor': ..., 'prev_cursor': ...}
+    """
+    try:
+        embed = serializers.parse_embed(request.args.get('embed'), {'author', 'images'})
+    except serializers.InvalidEmbed as e:
+        return api_error(str(e))
+    section = request.args.get('section')
+    search_query = request.args.get('search', '')
+    
+    query = post_query(*sorted(embed))
+    if section == 'forum':
+        query = query.filter(Post.section != 'marketplace')
+    elif section:
+        query = query.filter_by(section=section)
+    if search_query:
+        query = search.apply_search(query, Post, search_query).order_by(None)
+    
+    posts = keyset_paginate(
+        query, Post, api_limit(current_app.config['API_PER_PAGE'], current_app.config['API_MAX_PER_PAGE']),
+        after=request.args.get('after'), before=request.args.get('before')
+    )
+    feed = 'marketplace' if section == 'marketplace' else 'forum' if section else 'index'
+    tag_posts(feed, posts.items)
+    return jsonify({
+        'items': [api_post_json(post, embed) for post in posts.items],
+        'next_cursor': posts.next_cursor,
+        'prev_cursor': posts.prev_cursor,
+    })
+
+@bp.route('/api/v1/posts/bulk')
+@page_cache.cached()
+def api_posts_bulk():
+    """Несколько постов по ID одним запросом
+    
+    Параметры запроса: ids (через запятую, не больше API_BULK_MAX),
+    embed ('author', 'images', 'comments' — последние COMMENTS_PER_PAGE).
+    
+    Returns:
+        Response: JSON {'items': [...] в порядке ids, 'missing': [ID не найденных постов]}
+    """
+    try:
+        embed = serializers.parse_embed(request.args.get('embed'))
+        ids = list(dict.fromkeys(int(value) for value in request.args.get('ids', '').split(',') if value.strip()))
+    except serializers.InvalidEmbed as e:
+        return api_error(str(e))
+    except ValueError:
+        return api_error('ids: ожидается список чисел через запятую')
+    if not ids:
+        return api_error('ids: укажите хотя бы один ID')
+    if len(ids) > current_app.config['API_BULK_MAX']:
+        return api_error(f'ids: не больше {current_app.config["API_BULK_MAX"]} постов за запрос')
+    
+    found = {post.id: post for post in post_query(*sorted(embed - {'comments'})).filter(Post.id.in_(ids))}
+    comments = recent_comments(found.values(), current_app.config['COMMENTS_PER_PAGE']) if 'comments' in embed else {}
+    missing = [post_id for post_id in ids if post_id not in found]
+    page_cache.tag(*[f'post:{post_id}' for post_id in found])
+    if missing:
+        # Пост с отсутствующим ID может появиться: ответ сбрасывается вместе с лентами
+        page_cache.tag('feed:index')
+    return jsonify({
+        'items': [
+            api_post_json(found[post_id], embed, content=True, comments=comments.get(post_id))
+            for post_id in ids if post_id in found
+        ],
+        'missing': missing,
+    })
+
+@bp.route('/api/v1/posts/<int:post_id>')
+@page_cache.cached(on_hit=lambda post_id: view_counter.hit(post_id))
+def api_post(post_id):
+    """Пост в JSON с выбранными связями
+    
+    Параметр embed: 'author', 'images', 'comments' (первая страница
+    комментариев, следующие — через /api/v1/posts/<id>/comments).
+    
+    Args:
+        post_id (int): ID поста
+        
+    Returns:
+        Response: JSON поста
+    """
+    try:
+        embed = serializers.parse_embed(request.args.get('embed'))
+    except serializers.InvalidEmbed as e:
+        return api_error(str(e))
+    post = post_query(*sorted(embed - {'comments'})).filter_by(id=post_id).first()
+    if post is None:
+        return api_error('Пост не найден', 404)
+    view_counter.hit(post.id)
+    page_cache.tag(f'post:{post.id}')
+    
+    comments = comment_page(post.id) if 'comments' in embed else None
+    data = api_post_json(post, embed, content=True, comments=comments.items if comments else None)
+    if comments is not None:
+        data['comments_next_cursor'] = comments.next_cursor
+    return jsonify(data)
+
+@bp.route('/api/v1/posts/<int:post_id>/comments')
+@page_cache.cached()
+def api_post_comments(post_id):
+    """Страница комментариев поста в JSON от новых к старым
+    
+    Args:
+        post_id (int): ID поста
+        
+    Returns:
+        Response: JSON {'items': [...], 'next_cursor': ...}
+    """
+    comments = comment_page(post_id, request.args.get('after'))
+    page_cache.tag(f'post:{post_id}')
+    return jsonify({
+        'items': [serializers.comment_json(comment) for comment in comments.items],
+        'next_cursor': comments.next_cursor,
+    })
+
+@bp.route('/post/<int:post_id>/comment', methods=['POST'])
 @login_required
+@rate_limiter.limit('add_comment')
 def add_comment(post_id):
     """Добавление комментария к посту
     
@@ -148,21 +757,24 @@ def add_comment(post_id):
     
     if not text:
         flash('Комментарий не может быть пустым', 'error')
-        return redirect(url_for('post_detail', post_id=post_id))
+        return redirect(url_for('main.post_detail', post_id=post_id))
     
     comment = Comment(
         text=text,
         user_id=current_user.id,
-        post_id=post.id
+        post_id=post.id,
+        created_at=datetime.utcnow()
     )
     
     db.session.add(comment)
+    count_new_comment(comment)
     db.session.commit()
+    page_cache.invalidate(f'post:{post.id}', *feed_tags(post.section))
     
     flash('Комментарий добавлен', 'success')
-    return redirect(url_for('post_detail', post_id=post_id))
+    return redirect(url_for('main.post_detail', post_id=post_id))
 
-@app.route('/comment/<int:comment_id>/delete', methods=['POST'])
+@bp.route('/comment/<int:comment_id>/delete', methods=['POST'])
 @login_required
 def delete_comment(comment_id):
     """Удаление комментария
@@ -178,13 +790,16 @@ def delete_comment(comment_id):
     if comment.user_id != current_user.id and not current_user.is_admin:
         abort(403)
     
+    post = comment.post
     db.session.delete(comment)
+    recount_comments(post.id)
     db.session.commit()
+    page_cache.invalidate(f'post:{post.id}', *feed_tags(post.section))
     
     flash('Комментарий удалён', 'success')
-    return redirect(url_for('post_detail', post_id=comment.post_id))
+    return redirect(url_for('main.post_detail', post_id=post.id))
 
-@app.route('/profile')
+@bp.route('/profile')
 @login_required
 def profile():
     """Страница профиля пользователя с его постами
@@ -192,11 +807,11 @@ def profile():
     Returns:
         Response: HTML-страница профиля
     """
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(user_id=current_user.id).order_by(Post.created_at.desc()).paginate(page=page, per_page=5)
+    posts = feed_page(post_query().filter_by(user_id=current_user.id), per_page=5)
     return render_template('profile.html', posts=posts)
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
+@rate_limiter.limit('register')
 def register():
     """Регистрация нового пользователя
     
@@ -209,7 +824,7 @@ def register():
         
         if User.query.filter_by(username=username).first():
             flash('Имя пользователя уже занято!', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         new_user = User(username=username)
         new_user.set_password(password)
@@ -217,11 +832,12 @@ def register():
         db.session.commit()
         
         flash('Регистрация успешна!', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit('login', user_key=lambda: request.form.get('username'))
 def login():
     """Аутентификация пользователя
     
@@ -235,13 +851,13 @@ def login():
         
         if user and user.check_password(password):
             login_user(user)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Неверный логин или пароль!', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     """Выход пользователя из системы
@@ -250,9 +866,10 @@ def logout():
         Response: Перенаправление на главную страницу
     """
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/forum')
+@bp.route('/forum')
+@page_cache.cached()
 def forum():
     """Страница форума с фильтрацией и поиском
     
@@ -262,59 +879,87 @@ def forum():
     page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '')
     section_filter = request.args.get('section_filter', '')
+    # 'new' — по дате создания, 'activity' — по последнему комментарию
+    sort = request.args.get('sort', 'new')
+    sort_attr = 'last_activity_at' if sort == 'activity' else 'created_at'
     
-    query = Post.query.filter(Post.section != 'marketplace')
+    query = post_query('author').filter(Post.section != 'marketplace')
     
     if search_query:
-        query = query.filter(
-            (Post.title.ilike(f'%{search_query}%')) | 
-            (Post.content.ilike(f'%{search_query}%'))
-        )
+        query = search.apply_search(query, Post, search_query)
     
     if section_filter:
         query = query.filter_by(section=section_filter)
     
-    posts = query.order_by(Post.created_at.desc()).paginate(page=page, per_page=10)
-    return render_template('forum.html', posts=posts, search_query=search_query, section_filter=section_filter)
+    if search_query:
+        # Результаты поиска отсортированы по релевантности, поэтому листаются по номеру страницы
+        posts = query.order_by(getattr(Post, sort_attr).desc()).paginate(page=page, per_page=10)
+    else:
+        posts = feed_page(query, per_page=10, sort=sort_attr)
+    tag_posts('forum', posts.items)
+    return render_template(
+        'forum.html',
+        posts=posts,
+        search_query=search_query,
+        section_filter=section_filter,
+        sort=sort
+    )
 
-@app.route('/marketplace')
+@bp.route('/marketplace')
+@page_cache.cached()
 def marketplace():
-    """Страница торговой площадки
+    """Страница торговой площадки с фильтрами, сортировкой и фасетами
     
     Returns:
         Response: HTML-страница с товарами
     """
     page = request.args.get('page', 1, type=int)
-    search_query = request.args.get('search', '')
-    min_price = request.args.get('min_price', type=float)
-    max_price = request.args.get('max_price', type=float)
-    
-    query = Post.query.filter_by(section='marketplace').options(
-        db.joinedload(Post.comments),
-        db.joinedload(Post.images)
-    )
+    filters = marketplace_filters()
+    sort = request.args.get('sort', 'new')
+    if sort not in MARKETPLACE_SORTS:
+        sort = 'new'
     
-    if search_query:
-        query = query.filter(Post.title.ilike(f'%{search_query}%'))
+    query = apply_marketplace_filters(post_query('author', 'images').filter_by(section='marketplace'), filters)
     
-    # Фильтрация по цене
-    if min_price is not None:
-        query = query.filter(Post.price >= min_price)
-    if max_price is not None:
-        query = query.filter(Post.price <= max_price)
+    if sort == 'new' and not filters['search']:
+        items = feed_page(query, per_page=5)
+    else:
+        # Результаты поиска и сортировки по цене/просмотрам листаются по номеру страницы.
+        # Поиск упорядочивает по релевантности: она остаётся главной только для sort=new
+        if sort != 'new':
+            query = query.order_by(None)
+        items = query.order_by(*MARKETPLACE_SORTS[sort]).paginate(page=page, per_page=5)
+    tag_posts('marketplace', items.items)
     
-    items = query.order_by(Post.created_at.desc()).paginate(page=page, per_page=5)
+    facet_counts = facets.cached_facets(
+        tuple(sorted(filters.items())),
+        current_app.config['FACET_CACHE_TTL'],
+        lambda: facets.compute_facets(
+            lambda exclude: apply_marketplace_filters(Post.query.filter_by(section='marketplace'), filters, exclude),
+            Post, User, Image
+        )
+    )
+    filter_args = {
+        key: request.args.get(key)
+        for key in ('search', 'min_price', 'max_price', 'price', 'seller', 'has_images', 'sort')
+        if request.args.get(key)
+    }
     
     return render_template(
         'marketplace.html',
         items=items,
-        search_query=search_query,
-        min_price=min_price,
-        max_price=max_price
+        recent_comments=recent_comments(items.items),
+        search_query=filters['search'],
+        filters=filters,
+        filter_args=filter_args,
+        sort=sort,
+        facets=facet_counts,
+        price_buckets=facets.PRICE_BUCKETS
     )
 
-@app.route('/create_post', methods=['GET', 'POST'])
+@bp.route('/create_post', methods=['GET', 'POST'])
 @login_required
+@rate_limiter.limit('create_post')
 def create_post():
     """Создание нового поста
     
@@ -329,13 +974,13 @@ def create_post():
         
         if not title or not content:
             flash('Заголовок и содержание поста обязательны', 'error')
-            return redirect(url_for('create_post'))
+            return redirect(url_for('main.create_post'))
         
         try:
             price_value = float(price) if price else None
         except ValueError:
             flash('Некорректное значение цены', 'error')
-            return redirect(url_for('create_post'))
+            return redirect(url_for('main.create_post'))
         
         new_post = Post(
             title=title,
@@ -349,35 +994,27 @@ def create_post():
             db.session.add(new_post)
             db.session.commit()
             
-            if 'images' in request.files:
-                for file in request.files.getlist('images'):
-                    if file and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
-                        
-                        img = Image(
-                            filename=filename,
-                            post_id=new_post.id
-                        )
-                        db.session.add(img)
-                
-                db.session.commit()
+            uploaded = store_images(request.files.getlist('images'), new_post.id)
+            db.session.commit()
             
+            for filepath in uploaded:
+                image_pipeline.submit(filepath)
+            page_cache.invalidate(*feed_tags(new_post.section))
             flash('Пост успешно создан!', 'success')
-            return redirect(url_for('post_detail', post_id=new_post.id))
+            return redirect(url_for('main.post_detail', post_id=new_post.id))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при создании поста: {str(e)}', 'error')
-            return redirect(url_for('create_post'))
+            return redirect(url_for('main.create_post'))
     
     section = request.args.get('section')
     show_price = request.args.get('price') == '1'
     return render_template('create_post.html', section=section, show_price=show_price)
 
-@app.route('/edit_post/<int:post_id>', methods=['GET', 'POST'])
+@bp.route('/edit_post/<int:post_id>', methods=['GET', 'POST'])
 @login_required
+@rate_limiter.limit('edit_post')
 def edit_post(post_id):
     """Редактирование существующего поста
     
@@ -393,6 +1030,7 @@ def edit_post(post_id):
         abort(403)
 
     if request.method == 'POST':
+        old_section = post.section
         post.title = request.form['title']
         post.content = request.form['content']
         post.section = request.form['section']
@@ -402,28 +1040,20 @@ def edit_post(post_id):
             post.price = float(price) if price else None
         except ValueError:
             flash('Некорректное значение цены', 'error')
-            return redirect(url_for('edit_post', post_id=post.id))
+            return redirect(url_for('main.edit_post', post_id=post.id))
         
-        for i, file in enumerate(request.files.getlist('new_images')):
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                
-                image = Image(
-                    filename=filename,
-                    order=len(post.images) + i,
-                    post_id=post.id
-                )
-                db.session.add(image)
+        uploaded = store_images(request.files.getlist('new_images'), post.id, start=len(post.images))
         
         db.session.commit()
+        for filepath in uploaded:
+            image_pipeline.submit(filepath)
+        page_cache.invalidate(f'post:{post.id}', *feed_tags(old_section, post.section))
         flash('Пост успешно обновлен!', 'success')
-        return redirect(url_for('post_detail', post_id=post.id))
+        return redirect(url_for('main.post_detail', post_id=post.id))
     
     return render_template('edit_post.html', post=post)
 
-@app.route('/delete_post/<int:post_id>', methods=['POST'])
+@bp.route('/delete_post/<int:post_id>', methods=['POST'])
 @login_required
 def delete_post(post_id):
     """Удаление поста
@@ -440,25 +1070,213 @@ def delete_post(post_id):
         abort(403)
     
     try:
-        for image in post.images:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], image.filename))
-            except OSError:
-                pass
-        
+        filenames = {image.filename for image in post.images}
+        section = post.section
         db.session.delete(post)
         db.session.commit()
+        if filenames:
+            job_queue.enqueue('release_uploads', filenames=sorted(filenames))
+        page_cache.invalidate(f'post:{post_id}', *feed_tags(section))
         
         flash('Пост успешно удален', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Ошибка при удалении поста: {str(e)}', 'error')
     
-    return redirect(url_for('forum'))
+    return redirect(url_for('main.forum'))
 
-def create_test_data():
-    """Создание тестовых данных в БД"""
-    with app.app_context():
+@bp.cli.command('init-db')
+def init_db():
+    """Создание или обновление схемы БД миграциями и полнотекстового индекса"""
+    init_migrations(current_app)
+    from flask_migrate import upgrade
+    upgrade()
+    if search.is_supported(db.engine):
+        with db.engine.begin() as connection:
+            search.ensure_index(connection)
+    print('Схема базы данных актуальна')
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Перестройка полнотекстового индекса постов для существующей БД"""
+    if not search.is_supported(db.engine):
+        print('Полнотекстовый индекс поддерживается только для SQLite')
+        return
+    with db.engine.begin() as connection:
+        search.ensure_index(connection)
+        total = search.rebuild_index(connection)
+    print(f'Проиндексировано постов: {total}')
+
+@bp.cli.command('process-images')
+def process_images():
+    """Создание вариантов размеров для ещё не обработанных изображений"""
+    current_app.config['IMAGE_PIPELINE_SYNC'] = True
+    filenames = [row.filename for row in db.session.query(Image.filename).filter_by(processed=False).distinct()]
+    for filename in filenames:
+        image_pipeline.submit(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    print(f'Обработано изображений: {len(filenames)}')
+
+@bp.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Только показать файлы, не удаляя их')
+@click.option('--min-age', default=3600, show_default=True, help='Не трогать файлы моложе N секунд')
+def gc_uploads(dry_run, min_age):
+    """Удаление файлов загрузок, на которые не ссылается ни одна запись Image"""
+    referenced = {row.filename for row in db.session.query(Image.filename).distinct()}
+    orphans = storage.find_orphans(current_app.config['UPLOAD_FOLDER'], referenced, images.variant_stem, min_age=min_age)
+    for name in orphans:
+        print(name)
+        if not dry_run:
+            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], name))
+    print(f'{"Найдено" if dry_run else "Удалено"} файлов без ссылок: {len(orphans)}')
+
+@bp.cli.group('jobs')
+def jobs_cli():
+    """Просмотр и обработка очереди фоновых задач"""
+
+def format_job_time(timestamp):
+    """Время задачи для вывода в консоль"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else '-'
+
+@jobs_cli.command('status')
+def jobs_status():
+    """Количество задач в очереди и мёртвых задач по типам"""
+    pending = job_queue.pending()
+    dead = job_queue.dead()
+    names = sorted({job['name'] for job in pending + dead})
+    print(f'{"задача":<24}{"в очереди":>10}{"выполняется":>13}{"повтор":>8}{"мёртвые":>9}')
+    for name in names:
+        jobs = [job for job in pending if job['name'] == name]
+        print(
+            f'{name:<24}{len(jobs):>10}{sum(job["leased"] for job in jobs):>13}'
+            f'{sum(1 for job in jobs if job["attempts"] and not job["leased"]):>8}'
+            f'{sum(1 for job in dead if job["name"] == name):>9}'
+        )
+    print(f'Всего в очереди: {len(pending)}, мёртвых: {len(dead)}')
+
+@jobs_cli.command('list')
+@click.option('--dead', is_flag=True, help='Показать мёртвые задачи')
+def jobs_list(dead):
+    """Список задач с аргументами и последней ошибкой"""
+    for job in job_queue.dead() if dead else job_queue.pending():
+        when = format_job_time(job['failed_at'] if dead else job['run_at'])
+        state = 'мёртвая' if dead else 'выполняется' if job['leased'] else 'ожидает'
+        payload = json.dumps(job['payload'], ensure_ascii=False)
+        print(f'#{job["id"]} {job["name"]} {state}, попыток: {job["attempts"]}, {when}: {payload}')
+        if job['error']:
+            print(f'    {job["error"]}')
+
+@jobs_cli.command('drain')
+def jobs_drain():
+    """Выполнение всех готовых задач в текущем процессе"""
+    count = job_queue.drain()
+    print(f'Выполнено попыток: {count}, осталось в очереди: {len(job_queue.pending())}')
+
+@jobs_cli.command('retry-dead')
+@click.argument('job_ids', nargs=-1, type=int)
+def jobs_retry_dead(job_ids):
+    """Возврат мёртвых задач в очередь (по умолчанию всех)"""
+    print(f'Возвращено в очередь: {job_queue.revive(list(job_ids) or None)}')
+
+@jobs_cli.command('purge-dead')
+def jobs_purge_dead():
+    """Удаление всех мёртвых задач"""
+    print(f'Удалено мёртвых задач: {job_queue.purge_dead()}')
+
+def sample_page_requests(client):
+    """Набор запросов к основным страницам для проверок производительности
+    
+    Каждая страница запрашивается анонимно и от имени автора первого поста.
+    Курсорные ленты запрашиваются и с параметрами after/before, чтобы
+    проверялись планы глубоких страниц, а не только первой.
+    
+    Args:
+        client (FlaskClient): Тестовый клиент приложения
+        
+    Returns:
+        list: Пары (подпись URL, функция, выполняющая запрос и возвращающая ответ)
+    """
+    post = Post.query.order_by(Post.id).first()
+    user = post.author if post else User.query.first()
+    urls = ['/', '/forum', '/forum?section_filter=guides', '/forum?sort=activity',
+            '/forum?section_filter=guides&sort=activity', '/forum?search=a',
+            '/marketplace', '/marketplace?min_price=0&max_price=1000',
+            '/marketplace?sort=price_asc', '/marketplace?sort=price_desc&price=1000-5000',
+            '/marketplace?sort=views&has_images=1']
+    if post:
+        urls += [f'/post/{post.id}', f'/post/{post.id}/comments',
+                 f'/api/v1/posts/{post.id}?embed=author,images,comments',
+                 f'/api/v1/posts/bulk?ids={post.id},{post.id + 1}&embed=author,images,comments']
+    urls += ['/api/v1/posts?embed=author,images', '/api/v1/posts?section=marketplace', '/api/v1/posts?search=a']
+    # Курсоры по посту из середины ленты, чтобы страницы после и до него были непустыми
+    cursor_post = Post.query.order_by(Post.created_at.desc(), Post.id.desc()).offset(10).first() or post
+    if cursor_post:
+        created = encode_cursor(cursor_post.created_at, cursor_post.id)
+        activity = encode_cursor(cursor_post.last_activity_at, cursor_post.id)
+        for direction in ('after', 'before'):
+            urls += [f'/?{direction}={created}', f'/forum?{direction}={created}',
+                     f'/forum?sort=activity&{direction}={activity}',
+                     f'/forum?section_filter=guides&sort=activity&{direction}={activity}',
+                     f'/marketplace?{direction}={created}', f'/api/v1/posts?{direction}={created}',
+                     f'/api/v1/posts?section=marketplace&{direction}={created}']
+
+    def make_request(url, user_id):
+        def perform():
+            with client.session_transaction() as session:
+                if user_id is None:
+                    session.pop('_user_id', None)
+                else:
+                    session['_user_id'] = str(user_id)
+            # Отдельный контекст на каждый запрос, чтобы не переиспользовать g
+            with client.application.app_context():
+                return client.get(url)
+        return perform
+
+    requests = [(url, make_request(url, None)) for url in urls]
+    if user:
+        requests += [(f'{url} [{user.username}]', make_request(url, user.id)) for url in urls + ['/profile']]
+    return requests
+
+@bp.cli.command('check-query-budgets')
+def check_query_budgets():
+    """Проверка страниц на превышение бюджета SQL-запросов (QUERY_BUDGETS)"""
+    current_app.config['TESTING'] = True
+    current_app.config['PAGE_CACHE_ENABLED'] = False
+    current_app.config['QUERY_BUDGET_ENFORCE'] = True
+    failed = False
+    for url, perform in sample_page_requests(current_app.test_client()):
+        try:
+            response = perform()
+            print(f'OK   {url} ({response.status_code}, запросов: {response.headers["X-Query-Count"]})')
+        except QueryBudgetExceeded as e:
+            failed = True
+            print(f'FAIL {url}: {e}')
+    if failed:
+        raise SystemExit(1)
+
+@bp.cli.command('explain-queries')
+def explain_queries():
+    """Проверка планов запросов страниц (EXPLAIN QUERY PLAN) на полные сканирования"""
+    current_app.config['TESTING'] = True
+    current_app.config['PAGE_CACHE_ENABLED'] = False
+    tables = set(db.metadata.tables)
+    report = queryplan.explain_requests(db.engine, tables, sample_page_requests(current_app.test_client()))
+    failed = False
+    for url, statement, scans in report:
+        if scans:
+            failed = True
+            print(f'SCAN {url}: ' + '; '.join(scans))
+            print('     ' + ' '.join(statement.split()))
+    print(f'Проверено запросов: {len(report)}, с полным сканированием: {sum(1 for *_, scans in report if scans)}')
+    if failed:
+        raise SystemExit(1)
+
+def create_test_data(app=None):
+    """Создание тестовых данных в БД
+
+    Args:
+        app (Flask, optional): Приложение; по умолчанию default_app()
+    """
+    with (app or default_app()).app_context():
         try:
             if User.query.first() is None:
                 admin = User(username="admin")
@@ -516,6 +1334,8 @@ def create_test_data():
                 )
                 
                 db.session.add_all([comment1, comment2])
+                recount_comments(post1.id)
+                recount_comments(post2.id)
                 db.session.commit()
                 
                 print("Тестовые данные успешно созданы!")
@@ -523,11 +1343,143 @@ def create_test_data():
             db.session.rollback()
             print(f"Ошибка при создании тестовых данных: {str(e)}")
             
-def main():
-    """Запуск приложения."""
+def init_migrations(app):
+    """Подключение Flask-Migrate к приложению при первой необходимости
+
+    Импорт alembic заметно удлиняет запуск, а рабочим процессам сервера
+    миграции не нужны, поэтому расширение подключают только команды
+    ``flask db`` и ``flask init-db``.
+
+    Args:
+        app (Flask): Приложение
+
+    Returns:
+        click.Group: Команды Flask-Migrate
+    """
+    from flask_migrate import Migrate
+    from flask_migrate.cli import db as migrate_cli
+    if 'migrate' not in app.extensions:
+        Migrate(app, db, include_object=search.include_object)
+    return migrate_cli
+
+class MigrationCommands(click.Group):
+    """Группа ``flask db``, загружающая команды Flask-Migrate при вызове"""
+
+    def list_commands(self, ctx):
+        return init_migrations(current_app).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return init_migrations(current_app).get_command(ctx, name)
+
+def create_app(config_name=None, **overrides):
+    """Фабрика приложения
+    
+    Расширения и страницы создаются один раз при импорте модуля и
+    подключаются к каждому приложению, поэтому в одном процессе могут
+    работать приложения с разными профилями. Тяжёлые части
+    инициализируются лениво: Flask-Migrate — командами миграций, каталог
+    загрузок — при первой загрузке файла, хранилища кеша страниц,
+    ограничителя частоты и очереди задач — при первом обращении.
+    
+    Args:
+        config_name (str, optional): Профиль из config.PROFILES; по умолчанию
+            FORUM_CONFIG или 'default'
+        **overrides: Параметры конфигурации поверх профиля
+        
+    Returns:
+        Flask: Приложение
+    """
+    app = Flask(__name__)
+    app.config.from_object(config.get_config(config_name))
+    app.config.update(overrides)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dbconfig.engine_options(app.config)
+    
+    db.init_app(app)
+    sqlite_tuning.init_app(app, db)
+    login_manager.init_app(app)
+    request_metrics.init_app(app)
+    query_counter.init_app(app)
+    page_cache.init_app(app)
+    rate_limiter.init_app(app)
+    uploads.init_app(app)
+    http_cache.init_app(app)
+    job_queue.init_app(app)
+    view_counter.init_app(app)
+    image_pipeline.init_app(app)
+    user_cache.init_app(app)
+    app.register_blueprint(bp)
+    app.cli.add_command(MigrationCommands('db', help='Миграции схемы БД (Flask-Migrate)'))
+    return app
+
+_default_app = None
+
+def default_app():
+    """Приложение с профилем из FORUM_CONFIG, создаётся при первом обращении
+    
+    Его получают flask CLI (FLASK_APP=app.py), скрипты бенчмарков и
+    ``from app import app``.
+    
+    Returns:
+        Flask: Приложение
+    """
+    global _default_app
+    if _default_app is None:
+        _default_app = create_app()
+    return _default_app
+
+def __getattr__(name):
+    # Атрибут модуля app создаётся по требованию (PEP 562): import app не строит приложение
+    if name == 'app':
+        return default_app()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def reset_after_fork(app):
+    """Сброс соединений с БД, унаследованных рабочим процессом от мастера
+    
+    Args:
+        app (Flask): Приложение
+    """
     with app.app_context():
-        db.create_all()
-    app.run(host='0.0.0.0')
+        db.engine.dispose(close=False)
+
+def main(argv=None):
+    """Запуск приложения.
+    
+    По умолчанию запускается production-сервер Gunicorn с несколькими
+    процессами и потоками; ``--dev`` запускает встроенный сервер Flask.
+    Схема БД при старте не создаётся — для этого есть ``flask init-db``.
+    
+    Args:
+        argv (list, optional): Аргументы командной строки
+    """
+    parser = argparse.ArgumentParser(prog='game-forum', description='Запуск форума')
+    parser.add_argument('--dev', action='store_true', help='Встроенный сервер Flask для разработки')
+    parser.add_argument('--config', choices=sorted(config.PROFILES), help='Профиль конфигурации (по умолчанию FORUM_CONFIG)')
+    parser.add_argument('--bind', help='Адрес и порт, например 0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, help='Число рабочих процессов')
+    parser.add_argument('--threads', type=int, help='Число потоков в каждом процессе')
+    parser.add_argument('--keep-alive', type=int, dest='keepalive', help='Время удержания keep-alive соединения, секунды')
+    args = parser.parse_args(argv)
+    app = create_app(args.config)
+    
+    if args.dev:
+        host, _, port = (args.bind or '0.0.0.0:5000').rpartition(':')
+        app.run(host=host, port=int(port))
+        return
+    
+    workers = args.workers or app.config['SERVER_WORKERS']
+    if workers > 1 and app.config['PAGE_CACHE_BACKEND'] == 'memory':
+        app.logger.warning('Кеш страниц в памяти не инвалидируется между процессами; используйте PAGE_CACHE_BACKEND=file')
+    
+    import server
+    server.serve(
+        app,
+        on_fork=partial(reset_after_fork, app),
+        bind=args.bind,
+        workers=args.workers,
+        threads=args.threads,
+        keepalive=args.keepalive
+    )
 
 
 if __name__ == '__main__':
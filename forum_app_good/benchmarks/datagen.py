@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Генератор синтетических данных форума для нагрузочных тестов
+
+Создаёт заданное число пользователей, постов (в том числе товаров с ценой),
+комментариев и изображений. Данные детерминированы при одинаковом --seed.
+Строки вставляются пачками через Core, поисковый индекс и счётчики
+комментариев заполняются сразу. У всех пользователей пароль PASSWORD.
+
+Запуск (база берётся из SQLALCHEMY_DATABASE_URI, схема создаётся при необходимости):
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/forum-bench.db \\
+        python benchmarks/datagen.py --users 1000 --posts 50000 --comments 200000 --images 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import search  # noqa: E402
+
+PASSWORD = 'benchmark'
+BATCH_SIZE = 5000
+SECTIONS = ('discussion', 'guides', 'news', 'marketplace')
+WORDS = (
+    'dota cs2 скин нож патч гайд сборка герой турнир стрим рейтинг карта '
+    'оружие броня квест рейд клан обновление баланс мета билд продажа обмен '
+    'аккаунт предмет редкий легендарный фейд бабочка арена лига матч'
+).split()
+START = datetime(2023, 1, 1)
+
+
+def _insert(connection, table_or_insert, rows):
+    """Вставка строк пачками по BATCH_SIZE"""
+    statement = table_or_insert.insert() if hasattr(table_or_insert, 'insert') else table_or_insert
+    for offset in range(0, len(rows), BATCH_SIZE):
+        connection.execute(statement, rows[offset:offset + BATCH_SIZE])
+
+
+def _next_id(connection, table):
+    return (connection.execute(text(f'SELECT max(id) FROM "{table.name}"')).scalar() or 0) + 1
+
+
+def generate(connection, users=100, posts=1000, comments=5000, images=500, seed=42):
+    """Заполнение базы синтетическими данными
+
+    Новые строки добавляются к уже существующим; комментарии и изображения
+    распределяются по новым постам, авторы выбираются из новых пользователей.
+
+    Args:
+        connection: Connection SQLAlchemy внутри транзакции
+        users (int): Количество пользователей
+        posts (int): Количество постов
+        comments (int): Количество комментариев
+        images (int): Количество изображений
+        seed (int): Начальное значение генератора случайных чисел
+
+    Returns:
+        dict: Диапазоны ID созданных записей {'users': range, 'posts': range, ...}
+    """
+    from app import Comment, Image, Post, User
+
+    rnd = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    user_table, post_table = User.__table__, Post.__table__
+    comment_table, image_table = Comment.__table__, Image.__table__
+
+    first_user = _next_id(connection, user_table)
+    user_ids = range(first_user, first_user + users)
+    _insert(connection, user_table, [
+        {'id': user_id, 'username': f'bench{user_id}', 'password_hash': password_hash}
+        for user_id in user_ids
+    ])
+
+    first_post = _next_id(connection, post_table)
+    post_ids = range(first_post, first_post + posts)
+    post_rows = []
+    for post_id in post_ids:
+        section = rnd.choice(SECTIONS)
+        price = None
+        if section == 'marketplace' and rnd.random() > 0.1:
+            price = round(rnd.lognormvariate(6, 1.5), 2)
+        post_rows.append({
+            'id': post_id,
+            'title': ' '.join(rnd.choices(WORDS, k=rnd.randint(3, 8))).capitalize(),
+            'content': '<p>' + ' '.join(rnd.choices(WORDS, k=rnd.randint(20, 200))) + '</p>',
+            'section': section,
+            'price': price,
+            'created_at': START + timedelta(minutes=post_id),
+            'user_id': rnd.choice(user_ids),
+            'views': int(rnd.paretovariate(1.2)) - 1,
+            'comment_count': 0,
+        })
+    _insert(connection, post_table, post_rows)
+
+    # Половина комментариев приходится на немногие популярные посты
+    first_comment = _next_id(connection, comment_table)
+    comment_rows = []
+    for comment_id in range(first_comment, first_comment + comments if posts else first_comment):
+        if rnd.random() < 0.5:
+            post = post_rows[min(posts - 1, int(rnd.paretovariate(0.8)) - 1)]
+        else:
+            post = rnd.choice(post_rows)
+        comment_rows.append({
+            'id': comment_id,
+            'text': ' '.join(rnd.choices(WORDS, k=rnd.randint(3, 30))),
+            'created_at': post['created_at'] + timedelta(minutes=rnd.randint(1, 60 * 24 * 30)),
+            'user_id': rnd.choice(user_ids),
+            'post_id': post['id'],
+        })
+    _insert(connection, comment_table, comment_rows)
+
+    first_image = _next_id(connection, image_table)
+    image_rows = []
+    for order, image_id in enumerate(range(first_image, first_image + images if posts else first_image)):
+        image_rows.append({
+            'id': image_id,
+            'filename': uuid.UUID(int=rnd.getrandbits(128)).hex + '.jpg',
+            'order': order % 4,
+            'size': 'medium',
+            'post_id': rnd.choice(post_ids),
+            'processed': rnd.random() > 0.2,
+        })
+    _insert(connection, image_table, image_rows)
+
+    if post_rows:
+        connection.execute(text(
+            'UPDATE post SET '
+            'comment_count = (SELECT count(*) FROM comment WHERE comment.post_id = post.id), '
+            'last_comment_at = (SELECT max(created_at) FROM comment WHERE comment.post_id = post.id) '
+            'WHERE id BETWEEN :first AND :last'
+        ), {'first': post_ids[0], 'last': post_ids[-1]})
+
+    if search.is_supported(connection):
+        # Новая FTS-таблица заполняется при создании, существующая — здесь
+        search.ensure_index(connection)
+        _insert(connection, search.post_fts.insert().prefix_with('OR REPLACE'), [
+            {'rowid': row['id'], 'title': row['title'], 'content': search.strip_html(row['content'])}
+            for row in post_rows
+        ])
+
+    return {
+        'users': user_ids,
+        'posts': post_ids,
+        'comments': range(first_comment, first_comment + len(comment_rows)),
+        'images': range(first_image, first_image + len(image_rows)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import app, db
+
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            created = generate(connection, args.users, args.posts, args.comments, args.images, args.seed)
+    print(
+        ', '.join(f'{name}: {len(ids)}' for name, ids in created.items())
+        + f' за {time.perf_counter() - started:.1f} с'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Нагрузочный тест запущенного сервера на основных страницах форума
+
+Сервер запускается отдельно, например для сравнения:
+    game-forum --dev --bind 127.0.0.1:5000
+    game-forum --bind 127.0.0.1:5000 --workers 4 --threads 4
+
+Запуск:
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 16 --duration 20
+"""
+import argparse
+import http.client
+import itertools
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+PATHS = ['/', '/forum', '/marketplace', '/post/1']
+
+
+def worker(base, paths, deadline, latencies, errors, lock):
+    """Отправка запросов по одному keep-alive соединению до истечения времени"""
+    connection = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=30)
+    local_latencies = []
+    local_errors = 0
+    for path in itertools.cycle(paths):
+        if time.perf_counter() >= deadline:
+            break
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                local_errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            connection.close()
+            continue
+        local_latencies.append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--path', action='append', help='Страница для теста (можно повторять)')
+    args = parser.parse_args()
+
+    base = urlsplit(args.url)
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(base, args.path or PATHS, deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print('Нет успешных запросов')
+        return
+    latencies.sort()
+    print(f'Запросов: {len(latencies)}, ошибок: {sum(errors)}, время: {elapsed:.1f} с')
+    print(f'Пропускная способность: {len(latencies) / elapsed:.1f} запросов/с')
+    print(
+        f'Задержка, мс: среднее {statistics.mean(latencies) * 1000:.1f}, '
+        f'p50 {percentile(latencies, 0.50) * 1000:.1f}, '
+        f'p95 {percentile(latencies, 0.95) * 1000:.1f}, '
+        f'p99 {percentile(latencies, 0.99) * 1000:.1f}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Бенчмарк основных маршрутов форума на синтетических данных
+
+База заполняется генератором datagen во временном файле, после чего
+каждый сценарий выполняется тестовым клиентом заданное число раз. Для
+сценария печатаются задержки p50/p95/p99, среднее число SQL-запросов и
+пропускная способность (один поток, без сети). Результаты сохраняются
+в JSON; с --compare выводится сравнение с прошлым прогоном, а при
+регрессии (рост p95 больше --threshold или рост числа запросов) код
+выхода равен 1.
+
+Запуск:
+    python benchmarks/route_benchmark.py --posts 20000 --comments 100000 --requests 300
+    python benchmarks/route_benchmark.py --compare benchmarks/results/20261018-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault(
+    'SQLALCHEMY_DATABASE_URI',
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='forum-routes-'), 'bench.db')
+)
+
+from app import create_app, db  # noqa: E402
+from datagen import WORDS, generate  # noqa: E402
+from querycount import count_queries  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def build_scenarios(rnd, created):
+    """Сценарии: имя, признак авторизации и функция, возвращающая (метод, URL, данные формы)"""
+    post_ids = created['posts']
+
+    def price_range():
+        low = rnd.choice((0, 100, 500, 1000))
+        return f'/marketplace?min_price={low}&max_price={low * 5 or 100}'
+
+    return [
+        ('index', False, lambda: ('GET', '/', None)),
+        ('forum_search', False, lambda: ('GET', f'/forum?search={rnd.choice(WORDS)}', None)),
+        ('marketplace_price', False, lambda: ('GET', price_range(), None)),
+        ('post_detail', False, lambda: ('GET', f'/post/{rnd.choice(post_ids)}', None)),
+        ('create_post', True, lambda: ('POST', '/create_post', {
+            'title': ' '.join(rnd.choices(WORDS, k=5)),
+            'content': '<p>' + ' '.join(rnd.choices(WORDS, k=50)) + '</p>',
+            'section': rnd.choice(('discussion', 'marketplace')),
+            'price': str(rnd.randint(1, 5000)),
+        })),
+        ('add_comment', True, lambda: ('POST', f'/post/{rnd.choice(post_ids)}/comment', {
+            'text': ' '.join(rnd.choices(WORDS, k=10)),
+        })),
+    ]
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(client, request, repeat, warmup):
+    """Выполнение одного сценария и расчёт статистики"""
+    app = client.application
+    for _ in range(warmup):
+        method, url, data = request()
+        with app.app_context():
+            client.open(url, method=method, data=data)
+
+    timings, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        method, url, data = request()
+        with app.app_context():
+            request_started = time.perf_counter()
+            with count_queries() as counter:
+                response = client.open(url, method=method, data=data)
+            timings.append(time.perf_counter() - request_started)
+            queries.append(len(counter))
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'requests': repeat,
+        'errors': errors,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'queries': statistics.mean(queries),
+        'rps': repeat / elapsed,
+    }
+
+
+def git_revision():
+    """Текущий коммит для подписи результатов"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Сравнение с прошлым прогоном
+
+    Returns:
+        list: Названия сценариев с регрессией
+    """
+    regressions = []
+    print(f'\nСравнение с {baseline["meta"]["date"]} ({baseline["meta"].get("revision") or "?"}):')
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        change = current['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0.0
+        regressed = change > threshold or current['queries'] > previous['queries'] + 0.01
+        if regressed:
+            regressions.append(name)
+        print(
+            f'{name:<20} p95 {previous["p95_ms"]:8.2f} -> {current["p95_ms"]:8.2f} мс ({change:+.0%}), '
+            f'SQL {previous["queries"]:.1f} -> {current["queries"]:.1f}'
+            + ('  РЕГРЕССИЯ' if regressed else '')
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--images', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=20, help='Запросов прогрева на сценарий')
+    parser.add_argument('--scenario', action='append', help='Запустить только этот сценарий (можно повторять)')
+    parser.add_argument('--page-cache', action='store_true', help='Не отключать кеш страниц')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Файл результатов (по умолчанию benchmarks/results/<время>.json)')
+    parser.add_argument('--compare', help='Файл результатов прошлого прогона')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимый рост p95 при сравнении')
+    args = parser.parse_args()
+
+    app = create_app('benchmark', PAGE_CACHE_ENABLED=args.page_cache)
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            created = generate(connection, args.users, args.posts, args.comments, args.images, args.seed)
+    print(f'Данные сгенерированы за {time.perf_counter() - started:.1f} с')
+
+    anonymous = app.test_client()
+    authorized = app.test_client()
+    with authorized.session_transaction() as session:
+        session['_user_id'] = str(created['users'][0])
+
+    rnd = random.Random(args.seed)
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'dataset': {name: len(ids) for name, ids in created.items()},
+            'page_cache': args.page_cache,
+        },
+        'scenarios': {},
+    }
+    print(f'{"сценарий":<20}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>7}{"запр/с":>9}{"ошибок":>8}')
+    for name, needs_login, request in build_scenarios(rnd, created):
+        if args.scenario and name not in args.scenario:
+            continue
+        stats = run_scenario(authorized if needs_login else anonymous, request, args.requests, args.warmup)
+        results['scenarios'][name] = stats
+        print(
+            f'{name:<20}{stats["p50_ms"]:9.2f}{stats["p95_ms"]:9.2f}{stats["p99_ms"]:9.2f}'
+            f'{stats["queries"]:7.1f}{stats["rps"]:9.1f}{stats["errors"]:8}'
+        )
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены в {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
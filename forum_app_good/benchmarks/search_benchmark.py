@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Сравнение поиска через ILIKE и через FTS5 на сгенерированном корпусе
+
+Запуск:
+    python benchmarks/search_benchmark.py --posts 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, or_, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import search  # noqa: E402
+from app import db, Post  # noqa: E402
+
+WORDS = (
+    'dota cs2 скин нож патч гайд сборка герой турнир стрим рейтинг карта '
+    'оружие броня квест рейд клан обновление баланс мета билд продажа обмен '
+    'аккаунт предмет редкий легендарный фейд бабочка арена лига матч'
+).split()
+QUERIES = ['нож', 'патч баланс', 'легендарный предмет', 'рейд клан обновление', 'dota']
+PER_PAGE = 10
+
+
+def generate_corpus(engine, posts):
+    """Заполнение базы пользователем и постами со случайным текстом"""
+    rnd = random.Random(42)
+    start = datetime(2023, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user (id, username, password_hash) VALUES (1, 'bench', '-')"
+        ))
+        batch = []
+        for i in range(1, posts + 1):
+            batch.append({
+                'id': i,
+                'title': ' '.join(rnd.choices(WORDS, k=6)),
+                'content': '<p>' + ' '.join(rnd.choices(WORDS, k=120)) + '</p>',
+                'section': rnd.choice(['discussion', 'guides', 'marketplace']),
+                'created_at': start + timedelta(minutes=i),
+                'user_id': 1,
+                'views': 0,
+            })
+            if len(batch) == 5000:
+                connection.execute(Post.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(Post.__table__.insert(), batch)
+
+
+def forum_page_ilike(session, query_text):
+    """Прежний путь /forum: ILIKE по заголовку и тексту, COUNT и страница"""
+    query = session.query(Post).filter(Post.section != 'marketplace').filter(or_(
+        Post.title.ilike(f'%{query_text}%'),
+        Post.content.ilike(f'%{query_text}%')
+    ))
+    query.count()
+    return query.order_by(Post.created_at.desc()).limit(PER_PAGE).all()
+
+
+def forum_page_fts(session, query_text):
+    """Новый путь /forum: FTS5 с ранжированием, COUNT и страница"""
+    query = session.query(Post).filter(Post.section != 'marketplace')
+    query = search.apply_search(query, Post, query_text)
+    query.count()
+    return query.order_by(Post.created_at.desc()).limit(PER_PAGE).all()
+
+
+def measure(engine, func, repeat):
+    """Замер времени выполнения всех запросов из QUERIES"""
+    timings = []
+    for query_text in QUERIES:
+        for _ in range(repeat):
+            with Session(engine) as session:
+                started = time.perf_counter()
+                func(session, query_text)
+                timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[int(len(timings) * 0.95) - 1],
+        'max': timings[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=50000, help='Количество постов в корпусе')
+    parser.add_argument('--repeat', type=int, default=10, help='Повторов на каждый запрос')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        db.metadata.create_all(engine)
+        generate_corpus(engine, args.posts)
+
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            search.ensure_index(connection)
+        print(f'Постов: {args.posts}, построение индекса: {time.perf_counter() - started:.2f} с')
+
+        for name, func in (('ilike', forum_page_ilike), ('fts5', forum_page_fts)):
+            result = measure(engine, func, args.repeat)
+            print(f"{name:>6}: p50={result['p50']:.2f} мс  p95={result['p95']:.2f} мс  max={result['max']:.2f} мс")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
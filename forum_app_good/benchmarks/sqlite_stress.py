@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Многопроцессный стресс-тест чтения и записи SQLite
+
+Несколько процессов одновременно читают ленту и страницу поста, увеличивают
+просмотры и добавляют комментарии во временную базу. Тест выполняется с
+настройками до настройки SQLite (профиль baseline: журнал DELETE,
+synchronous=FULL, без mmap и ожидания блокировки, пул SQLAlchemy по
+умолчанию) и с настройками приложения (профиль tuned: WAL, NORMAL,
+busy_timeout, увеличенный пул), после чего печатается число операций и
+ошибок "database is locked".
+
+Запуск:
+    python benchmarks/sqlite_stress.py --processes 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PROFILES = {
+    'baseline': {
+        'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0',
+        # Без ожидания блокировки: занятая база сразу даёт "database is locked"
+        'SQLITE_BUSY_TIMEOUT': '0',
+        # Размеры пула QueuePool по умолчанию
+        'DB_POOL_SIZE': '5', 'DB_MAX_OVERFLOW': '10',
+    },
+    'tuned': {},
+}
+
+
+def run_worker(seed, duration, write_ratio, results):
+    """Цикл случайных операций чтения и записи в одном процессе"""
+    from sqlalchemy.exc import OperationalError
+    from app import app, db, Post, Comment, User
+
+    rnd = random.Random(seed)
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'max_latency': 0.0}
+    with app.app_context():
+        db.engine.dispose(close=False)
+        # В профиле baseline начальное чтение тоже может упасть на блокировке
+        while True:
+            try:
+                post_ids = [row.id for row in db.session.query(Post.id)]
+                user_id = db.session.query(User.id).scalar()
+                break
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                time.sleep(0.01)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if rnd.random() < write_ratio:
+                    post_id = rnd.choice(post_ids)
+                    if rnd.random() < 0.5:
+                        db.session.query(Post).filter_by(id=post_id).update({'views': Post.views + 1})
+                    else:
+                        db.session.add(Comment(text='stress', user_id=user_id, post_id=post_id))
+                    db.session.commit()
+                    counts['writes'] += 1
+                else:
+                    db.session.query(Post).order_by(Post.created_at.desc()).limit(10).all()
+                    db.session.query(Comment).filter_by(post_id=rnd.choice(post_ids)).all()
+                    db.session.rollback()
+                    counts['reads'] += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                counts['locked'] += 1
+            counts['max_latency'] = max(counts['max_latency'], time.perf_counter() - started)
+    results.put(counts)
+
+
+def run_profile(name, processes, duration, write_ratio):
+    """Запуск теста с одним набором настроек в отдельной временной базе"""
+    directory = tempfile.mkdtemp(prefix='forum-stress-')
+    env = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'stress.db')}
+    env.update(PROFILES[name])
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    setup = context.Process(target=prepare_database, args=(env,))
+    setup.start()
+    setup.join()
+    workers = [
+        context.Process(target=run_in_env, args=(env, i, duration, write_ratio, results))
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    totals = [results.get(timeout=duration + 120) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    reads = sum(t['reads'] for t in totals)
+    writes = sum(t['writes'] for t in totals)
+    locked = sum(t['locked'] for t in totals)
+    max_latency = max(t['max_latency'] for t in totals)
+    print(
+        f'{name:>9}: чтений {reads / duration:8.1f}/с, записей {writes / duration:7.1f}/с, '
+        f'"database is locked": {locked}, максимальная задержка {max_latency * 1000:.0f} мс'
+    )
+
+
+def prepare_database(env):
+    """Создание схемы и небольшого набора данных"""
+    os.environ.update(env)
+    from app import app, db, Post, User
+    with app.app_context():
+        db.create_all()
+        user = User(username='stress')
+        user.set_password('stress')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(200):
+            db.session.add(Post(title=f'Пост {i}', content='текст', section='discussion', user_id=user.id))
+        db.session.commit()
+
+
+def run_in_env(env, seed, duration, write_ratio, results):
+    os.environ.update(env)
+    run_worker(seed, duration, write_ratio, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+    args = parser.parse_args()
+    for name in args.profile or ['baseline', 'tuned']:
+        run_profile(name, args.processes, args.duration, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Бенчмарк запуска рабочего процесса: импорт, создание приложения и первый запрос
+
+Каждый замер выполняется в отдельном процессе интерпретатора, как у
+нового рабочего процесса Gunicorn: импорт модуля app, вызов
+create_app(профиль), первый запрос (компиляция шаблонов, первое
+соединение с БД) и повторный запрос для сравнения. Печатаются медиана
+и минимум по всем запускам, а также число загруженных модулей и
+признак загрузки alembic.
+
+База с небольшим набором синтетических данных создаётся во временном
+каталоге, если не указан --database.
+
+Запуск:
+    python benchmarks/startup_benchmark.py --runs 10
+    python benchmarks/startup_benchmark.py --config production --url /forum
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+STAGES = ('import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms', 'process_ms')
+
+
+def measure_worker(config_name, database, url):
+    """Замеры внутри дочернего процесса
+
+    Returns:
+        dict: Длительности этапов в миллисекундах и сведения о модулях
+    """
+    # Файловые хранилища профиля — во временном каталоге, а не в instance/
+    scratch = tempfile.mkdtemp(prefix='forum-startup-worker-')
+    started = time.perf_counter()
+    import app as forum
+    imported = time.perf_counter()
+    application = forum.create_app(
+        config_name,
+        SQLALCHEMY_DATABASE_URI=database,
+        PAGE_CACHE_DIR=os.path.join(scratch, 'page_cache'),
+        RATE_LIMIT_PATH=os.path.join(scratch, 'ratelimit.db'),
+        JOB_QUEUE_PATH=os.path.join(scratch, 'jobs.db'),
+    )
+    created = time.perf_counter()
+    client = application.test_client()
+    with application.app_context():
+        status = client.get(url).status_code
+    first = time.perf_counter()
+    with application.app_context():
+        client.get(url)
+    second = time.perf_counter()
+    return {
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (first - created) * 1000,
+        'second_request_ms': (second - first) * 1000,
+        'status': status,
+        'modules': len(sys.modules),
+        'alembic': 'alembic' in sys.modules,
+    }
+
+
+def prepare_database(directory):
+    """Временная база со схемой и небольшим набором данных"""
+    from app import create_app, db, search
+    from datagen import generate
+
+    uri = 'sqlite:///' + os.path.join(directory, 'startup.db')
+    application = create_app('benchmark', SQLALCHEMY_DATABASE_URI=uri)
+    with application.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            search.ensure_index(connection)
+            generate(connection, users=20, posts=500, comments=2000, images=100, seed=42)
+    return uri
+
+
+def run_worker(config_name, database, url):
+    """Запуск одного дочернего процесса
+
+    Returns:
+        dict: Замеры процесса, включая полное время его работы
+    """
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker',
+        '--config', config_name, '--database', database, '--url', url,
+    ]
+    started = time.perf_counter()
+    output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=BASE_DIR).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='production', help='Профиль конфигурации')
+    parser.add_argument('--database', help='URI базы (по умолчанию временная база с синтетическими данными)')
+    parser.add_argument('--url', default='/', help='Адрес первого запроса')
+    parser.add_argument('--runs', type=int, default=5, help='Число запусков процесса')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure_worker(args.config, args.database, args.url)))
+        return
+
+    database = args.database or prepare_database(tempfile.mkdtemp(prefix='forum-startup-'))
+    results = [run_worker(args.config, database, args.url) for _ in range(args.runs)]
+
+    print(f'Профиль {args.config}, {args.url}, запусков: {args.runs}, статус: {results[-1]["status"]}')
+    print(f'{"этап":<20}{"медиана, мс":>14}{"минимум, мс":>14}')
+    for stage in STAGES:
+        values = [result[stage] for result in results]
+        print(f'{stage:<20}{statistics.median(values):14.1f}{min(values):14.1f}')
+    print(f'Загружено модулей: {results[-1]["modules"]}, alembic: {"да" if results[-1]["alembic"] else "нет"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Сравнение страниц авторизованного пользователя с кешем пользователей и без него
+
+Запросы выполняются тестовым клиентом к временной копии схемы с
+тестовыми данными; для каждой страницы печатается среднее время ответа
+и число SQL-запросов.
+
+Запуск:
+    python benchmarks/user_cache_benchmark.py --repeat 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault(
+    'SQLALCHEMY_DATABASE_URI',
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='forum-user-cache-'), 'bench.db')
+)
+
+from app import create_app, db, User, create_test_data, user_cache  # noqa: E402
+from querycount import count_queries  # noqa: E402
+
+URLS = ['/', '/forum', '/profile']
+
+
+def measure(client, url, repeat):
+    """Среднее время ответа и число запросов к БД для одной страницы"""
+    app = client.application
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with app.app_context():
+            started = time.perf_counter()
+            with count_queries() as counter:
+                client.get(url)
+            timings.append(time.perf_counter() - started)
+            queries = len(counter)
+    return statistics.mean(timings), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app('benchmark')
+    with app.app_context():
+        db.create_all()
+    create_test_data(app)
+    with app.app_context():
+        user_id = User.query.first().id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+    results = {}
+    for label, ttl in (('без кеша', 0), ('с кешем', 300)):
+        app.config['USER_CACHE_TTL'] = ttl
+        with app.app_context():
+            user_cache.clear()
+            client.get('/')
+        results[label] = {url: measure(client, url, args.repeat) for url in URLS}
+
+    print(f'{"страница":<12}{"без кеша":>24}{"с кешем":>24}')
+    for url in URLS:
+        cells = [
+            f'{results[label][url][0] * 1000:8.3f} мс, {results[label][url][1]} SQL'
+            for label in ('без кеша', 'с кешем')
+        ]
+        print(f'{url:<12}{cells[0]:>24}{cells[1]:>24}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Профили конфигурации приложения
+
+Профиль выбирается аргументом ``create_app(config_name)`` или переменной
+окружения ``FORUM_CONFIG`` ('default', 'testing', 'benchmark',
+'production'). Значения, зависящие от окружения, читаются при импорте
+модуля; отдельные параметры можно переопределить аргументами
+``create_app``.
+"""
+import os
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+class Config:
+    """Базовая конфигурация: разработка и запуск без явного профиля"""
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'SQLALCHEMY_DATABASE_URI',
+        'sqlite:///' + os.path.join(BASE_DIR, 'database.db')
+    )
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'ваш_секретный_ключ')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'gif'}
+    # Параметры соединений SQLite (см. dbconfig) и пул соединений
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = 30
+    # Ограничения загрузок: весь запрос, каждый файл и число файлов
+    MAX_CONTENT_LENGTH = 40 * 1024 * 1024
+    UPLOAD_MAX_FILE_SIZE = 10 * 1024 * 1024
+    UPLOAD_MAX_FILES = 10
+    # Время кеширования общего количества постов в лентах, секунды (0 — не считать)
+    FEED_COUNT_TTL = 60
+    # Время кеширования фасетов торговой площадки, секунды (0 — не кешировать)
+    FACET_CACHE_TTL = 30
+    # Количество комментариев на странице поста и в одной подгрузке
+    COMMENTS_PER_PAGE = 20
+    # Кеш страниц для анонимных пользователей: 'memory' — в процессе, 'file' — общий для воркеров каталог
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_TTL = 60
+    # Production-сервер (game-forum): по умолчанию 2 × CPU + 1 процессов с несколькими потоками
+    SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:5000')
+    SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    # Перезапуск рабочего процесса после N запросов защищает от утечек памяти
+    SERVER_MAX_REQUESTS = 10000
+    SERVER_ACCESS_LOG = os.environ.get('SERVER_ACCESS_LOG', '-')
+    # HTTP-кеширование: версии статики в URL, ETag страниц, сжатие ответов от COMPRESS_MIN_SIZE байт
+    STATIC_MAX_AGE = 365 * 24 * 3600
+    COMPRESS_MIN_SIZE = 1024
+    # Фоновые задачи: 'sqlite' — общий для воркеров файл, 'memory' — в процессе (теряются при перезапуске)
+    JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'sqlite')
+    JOB_QUEUE_WORKERS = 2
+    JOB_MAX_ATTEMPTS = 5
+    # JSON API: размер страницы по умолчанию и предельный, максимум постов в пакетном запросе
+    API_PER_PAGE = 20
+    API_MAX_PER_PAGE = 100
+    API_BULK_MAX = 100
+    # Метрики запросов (/metrics) и журнал медленных запросов; SQL и шаблоны замеряются у доли запросов
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
+    METRICS_SLOW_REQUEST_MS = 500
+    METRICS_SLOW_QUERY_MS = 100
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Хранилище метрик: 'memory' — в процессе, 'sqlite' — общий для воркеров файл (сумма по процессам)
+    METRICS_BACKEND = os.environ.get('METRICS_BACKEND', 'memory')
+    # Ограничение частоты записей: 'memory' — в процессе, 'sqlite' — общий для воркеров файл
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMITS = {
+        'login': '10/minute',
+        'register': '5/hour',
+        'create_post': '10/minute',
+        'edit_post': '30/minute',
+        'add_comment': '6/minute',
+    }
+    # Максимальное число SQL-запросов на страницу (проверяется при QUERY_BUDGET_ENFORCE)
+    QUERY_BUDGETS = {
+        'main.index': 3,
+        'main.forum': 4,
+        'main.profile': 3,
+        # Три дополнительных запроса — фасеты при промахе их кеша
+        'main.marketplace': 8,
+        'main.post_detail': 4,
+        'main.post_comments': 2,
+        'main.api_posts': 2,
+        'main.api_posts_bulk': 3,
+        'main.api_post': 3,
+        'main.api_post_comments': 1,
+    }
+
+
+class TestingConfig(Config):
+    """Тесты: база в памяти, синхронные фоновые задачи, без кешей и ограничений частоты"""
+
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URI', 'sqlite://')
+    PAGE_CACHE_ENABLED = False
+    RATE_LIMIT_ENABLED = False
+    USER_CACHE_TTL = 0
+    QUERY_BUDGET_ENFORCE = True
+    IMAGE_PIPELINE_SYNC = True
+    JOB_QUEUE_BACKEND = 'memory'
+    JOB_QUEUE_SYNC = True
+    METRICS_ENABLED = False
+
+
+class BenchmarkConfig(Config):
+    """Бенчмарки: замеряются сами маршруты, поэтому кеш страниц и лимиты выключены"""
+
+    TESTING = True
+    PAGE_CACHE_ENABLED = False
+    RATE_LIMIT_ENABLED = False
+    JOB_QUEUE_BACKEND = 'memory'
+    METRICS_ENABLED = False
+
+
+class ProductionConfig(Config):
+    """Production: несколько процессов Gunicorn с общими для них кешем страниц, лимитами и метриками"""
+
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'file')
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')
+    METRICS_BACKEND = os.environ.get('METRICS_BACKEND', 'sqlite')
+
+
+PROFILES = {
+    'default': Config,
+    'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Класс конфигурации профиля
+
+    Args:
+        name (str, optional): Имя профиля; по умолчанию FORUM_CONFIG или 'default'
+
+    Returns:
+        type: Класс конфигурации
+
+    Raises:
+        ValueError: Если профиль неизвестен
+    """
+    name = name or os.environ.get('FORUM_CONFIG', 'default')
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f'Неизвестный профиль конфигурации: {name}; доступны: {", ".join(PROFILES)}') from None
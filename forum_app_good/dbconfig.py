@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Настройка подключения к БД: пул соединений и параметры SQLite"""
+import sqlite3
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def is_memory_sqlite(uri):
+    """Проверка, что URI указывает на SQLite в памяти"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """Параметры create_engine для SQLALCHEMY_ENGINE_OPTIONS
+
+    Размер пула берётся из DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT,
+    для файловой SQLite тайм-аут ожидания блокировки драйвера совпадает
+    с SQLITE_BUSY_TIMEOUT. Явно заданные в SQLALCHEMY_ENGINE_OPTIONS
+    значения не перезаписываются.
+
+    Args:
+        config (dict): Конфигурация приложения
+
+    Returns:
+        dict: Параметры движка
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if is_memory_sqlite(uri):
+        # База в памяти живёт в одном соединении, пул ей не нужен
+        return options
+    if make_url(uri).get_backend_name() == 'sqlite':
+        connect_args = dict(options.get('connect_args', {}))
+        connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT'] / 1000)
+        options['connect_args'] = connect_args
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    return options
+
+
+def sqlite_pragmas(config):
+    """PRAGMA, выполняемые для каждого нового соединения SQLite
+
+    Args:
+        config (dict): Конфигурация приложения
+
+    Returns:
+        list: Пары (имя, значение)
+
+    Raises:
+        ValueError: Если задано недопустимое значение
+    """
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'Недопустимый SQLITE_JOURNAL_MODE: {journal_mode}')
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'Недопустимый SQLITE_SYNCHRONOUS: {synchronous}')
+    return [
+        # busy_timeout первым: смена режима журнала тоже требует блокировки
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT'])),
+        ('journal_mode', journal_mode),
+        ('synchronous', synchronous),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+    ]
+
+
+class SQLiteTuning:
+    """Расширение Flask, применяющее PRAGMA к соединениям SQLite
+
+    WAL позволяет читателям не ждать писателя, synchronous=NORMAL в режиме
+    WAL сокращает число fsync без риска повредить базу, busy_timeout
+    заставляет ждать освобождения блокировки вместо ошибки
+    "database is locked", а mmap ускоряет чтение. Для других СУБД
+    расширение ничего не делает.
+    """
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """Подключение к приложению; вызывается после db.init_app(app)
+
+        PRAGMA берутся из конфигурации этого приложения, поэтому приложения
+        с разными настройками могут работать в одном процессе.
+
+        Args:
+            app (Flask): Приложение
+            db (SQLAlchemy): Объект Flask-SQLAlchemy
+        """
+        pragmas = sqlite_pragmas(app.config)
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', partial(self._on_connect, pragmas))
+        app.extensions['sqlite_tuning'] = self
+
+    @staticmethod
+    def _on_connect(pragmas, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Фасеты торговой площадки: ценовые диапазоны, продавцы, наличие фото"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import case, exists, func
+
+
+# Ценовые диапазоны [от, до); None — без границы
+PRICE_BUCKETS = (
+    ('0-100', 0, 100),
+    ('100-500', 100, 500),
+    ('500-1000', 500, 1000),
+    ('1000-5000', 1000, 5000),
+    ('5000+', 5000, None),
+)
+NO_PRICE = 'none'
+SELLER_LIMIT = 10
+FACET_CACHE_SIZE = 256
+
+# Кеш фасетов отдельно для каждого приложения
+_facet_caches = weakref.WeakKeyDictionary()
+_facet_lock = threading.Lock()
+
+
+def bucket_range(key):
+    """Границы ценового диапазона по ключу
+
+    Args:
+        key (str): Ключ из PRICE_BUCKETS
+
+    Returns:
+        tuple: (от, до) или None, если ключ неизвестен
+    """
+    for bucket, low, high in PRICE_BUCKETS:
+        if bucket == key:
+            return low, high
+    return None
+
+
+def price_bucket(column):
+    """SQL-выражение с ключом ценового диапазона для колонки цены"""
+    whens = [(column.is_(None), NO_PRICE)]
+    for key, _, high in PRICE_BUCKETS:
+        if high is not None:
+            whens.append((column < high, key))
+    return case(*whens, else_=PRICE_BUCKETS[-1][0])
+
+
+def has_images(post_model, image_model):
+    """SQL-выражение: у поста есть хотя бы одно изображение"""
+    return exists().where(image_model.post_id == post_model.id)
+
+
+def compute_facets(query_for, post_model, user_model, image_model):
+    """Подсчёт фасетов агрегирующими запросами
+
+    Счётчики каждого фасета считаются с учётом всех активных фильтров,
+    кроме фильтра самого фасета, чтобы можно было переключиться на
+    соседнее значение.
+
+    Args:
+        query_for (callable): query_for(exclude) возвращает запрос постов
+            с текущими фильтрами, кроме перечисленных в exclude
+        post_model: Модель поста
+        user_model: Модель пользователя
+        image_model: Модель изображения
+
+    Returns:
+        dict: {'price': {ключ: количество}, 'seller': [(id, имя, количество)],
+        'has_images': {True: количество, False: количество}}
+    """
+    bucket = price_bucket(post_model.price).label('bucket')
+    price_rows = query_for(('price',)).order_by(None).with_entities(
+        bucket, func.count(post_model.id)
+    ).group_by(bucket).all()
+
+    seller_count = func.count(post_model.id).label('total')
+    seller_rows = query_for(('seller',)).order_by(None).join(
+        user_model, user_model.id == post_model.user_id
+    ).with_entities(
+        user_model.id, user_model.username, seller_count
+    ).group_by(user_model.id, user_model.username).order_by(seller_count.desc(), user_model.username).limit(
+        SELLER_LIMIT
+    ).all()
+
+    with_images = has_images(post_model, image_model).label('with_images')
+    image_rows = query_for(('has_images',)).order_by(None).with_entities(
+        with_images, func.count(post_model.id)
+    ).group_by(with_images).all()
+
+    return {
+        'price': {key: count for key, count in price_rows},
+        'seller': [(user_id, username, count) for user_id, username, count in seller_rows],
+        'has_images': {bool(flag): count for flag, count in image_rows},
+    }
+
+
+def cached_facets(key, ttl, compute):
+    """Фасеты с кешированием в памяти процесса на короткое время
+
+    Значения хранятся отдельно для текущего приложения.
+
+    Args:
+        key (tuple): Нормализованные параметры фильтров
+        ttl (float): Время жизни значения в секундах; 0 отключает кеш
+        compute (callable): Вычисляет фасеты при промахе
+
+    Returns:
+        dict: Фасеты
+    """
+    if not ttl:
+        return compute()
+    now = time.monotonic()
+    with _facet_lock:
+        cache = _facet_caches.setdefault(current_app._get_current_object(), OrderedDict())
+        cached = cache.get(key)
+        if cached and cached[0] > now:
+            cache.move_to_end(key)
+            return cached[1]
+    facets = compute()
+    with _facet_lock:
+        cache[key] = (now + ttl, facets)
+        cache.move_to_end(key)
+        while len(cache) > FACET_CACHE_SIZE:
+            cache.popitem(last=False)
+    return facets
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""HTTP-кеширование: версии статики, условные ответы страниц и сжатие"""
+import gzip
+import hashlib
+import os
+
+from flask import current_app, request
+
+import images
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+
+FINGERPRINT_LENGTH = 12
+# Загрузки хранятся под именем, равным хешу загруженного содержимого, поэтому параметр v им не нужен.
+# Неизменяемы только варианты размеров: исходный файл после загрузки пересохраняется без
+# метаданных под тем же именем и отдаётся с ревалидацией по ETag и Last-Modified.
+UPLOADS_PREFIX = 'uploads/'
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript',
+})
+
+
+def file_fingerprint(path):
+    """Короткий хеш содержимого файла для URL статики
+
+    Args:
+        path (str): Путь к файлу
+
+    Returns:
+        str: Первые FINGERPRINT_LENGTH символов SHA-256 или None, если файла нет
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def choose_encoding(accept_encoding):
+    """Кодировка сжатия, поддерживаемая клиентом: 'br', 'gzip' или None
+
+    Args:
+        accept_encoding: request.accept_encodings
+    """
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+class HttpCache:
+    """Расширение Flask: заголовки кеширования и сжатие ответов
+
+    - ``url_for('static', ...)`` добавляет к URL параметр ``v`` с хешем
+      содержимого файла; ответы на такие URL и на варианты размеров
+      загруженных изображений получают
+      ``Cache-Control: public, max-age=STATIC_MAX_AGE, immutable``.
+    - Исходные загруженные файлы отдаются с ``Cache-Control: public, no-cache``:
+      браузер переспрашивает их с ``If-None-Match``/``If-Modified-Since``
+      и получает новую версию после удаления метаданных.
+    - HTML-страницы получают слабый ETag по содержимому и
+      ``Cache-Control: no-cache``, поэтому повторный запрос с
+      ``If-None-Match`` возвращает 304 без тела.
+    - Текстовые ответы больше ``COMPRESS_MIN_SIZE`` байт сжимаются brotli
+      (если установлен пакет brotli) или gzip.
+    """
+
+    def __init__(self, app=None):
+        self._fingerprints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('STATIC_FINGERPRINT', True)
+        app.config.setdefault('STATIC_MAX_AGE', 365 * 24 * 3600)
+        app.config.setdefault('CONDITIONAL_PAGES', True)
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+        app.extensions['http_cache'] = self
+        app.url_defaults(self._static_version)
+        app.after_request(self._process_response)
+
+    def fingerprint(self, filename):
+        """Версия файла статики; пересчитывается при изменении mtime
+
+        Args:
+            filename (str): Путь внутри каталога статики
+
+        Returns:
+            str: Хеш содержимого или None, если файла нет
+        """
+        path = os.path.join(current_app.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._fingerprints.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, file_fingerprint(path))
+            self._fingerprints[path] = cached
+        return cached[1]
+
+    def _static_version(self, endpoint, values):
+        if endpoint != 'static' or 'v' in values or not current_app.config['STATIC_FINGERPRINT']:
+            return
+        filename = values.get('filename', '')
+        if filename.startswith(UPLOADS_PREFIX):
+            return
+        version = self.fingerprint(filename)
+        if version:
+            values['v'] = version
+
+    def _is_immutable(self, filename):
+        if filename.startswith(UPLOADS_PREFIX):
+            return images.variant_stem(filename[len(UPLOADS_PREFIX):]) is not None
+        version = request.args.get('v')
+        return bool(version) and version == self.fingerprint(filename)
+
+    def _process_response(self, response):
+        if request.endpoint == 'static':
+            if response.status_code not in (200, 304):
+                return response
+            filename = (request.view_args or {}).get('filename', '')
+            if self._is_immutable(filename):
+                max_age = current_app.config['STATIC_MAX_AGE']
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+                response.cache_control.immutable = True
+            elif filename.startswith(UPLOADS_PREFIX):
+                response.cache_control.max_age = None
+                response.cache_control.public = True
+                response.cache_control.no_cache = True
+            return response
+
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or request.method not in ('GET', 'HEAD')
+        ):
+            return response
+
+        if current_app.config['CONDITIONAL_PAGES'] and response.mimetype == 'text/html':
+            if not response.get_etag()[0]:
+                response.add_etag(weak=True)
+            if not response.headers.get('Cache-Control'):
+                response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        if current_app.config['COMPRESS_ENABLED']:
+            self._compress(response)
+        return response
+
+    def _compress(self, response):
+        if (
+            response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or (response.content_length or 0) < current_app.config['COMPRESS_MIN_SIZE']
+        ):
+            return
+        encoding = choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return
+        data = response.get_data()
+        if encoding == 'br':
+            data = brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+        else:
+            data = gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL'], mtime=0)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
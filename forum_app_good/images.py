@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Фоновая обработка загруженных изображений: проверка, очистка метаданных, варианты размеров"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+
+
+# Максимальная ширина каждого варианта в пикселях
+VARIANTS = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+# Форматы вариантов: WebP для современных браузеров и JPEG как запасной
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+MAX_PIXELS = 40_000_000
+
+
+class InvalidImage(ValueError):
+    """Загруженный файл не является поддерживаемым изображением"""
+
+
+def variant_filename(filename, size, extension):
+    """Имя файла варианта изображения
+
+    Args:
+        filename (str): Имя исходного файла
+        size (str): Вариант размера ('small', 'medium', 'large')
+        extension (str): Расширение формата ('webp' или 'jpg')
+
+    Returns:
+        str: Имя файла варианта
+    """
+    stem = os.path.splitext(filename)[0]
+    return f'{stem}.{size}.{extension}'
+
+
+def variant_filenames(filename):
+    """Имена всех вариантов изображения
+
+    Args:
+        filename (str): Имя исходного файла
+
+    Returns:
+        list: Имена файлов вариантов
+    """
+    return [variant_filename(filename, size, extension) for size in VARIANTS for extension in FORMATS]
+
+
+def variant_stem(name):
+    """Имя исходного файла без расширения для файла-варианта
+
+    Args:
+        name (str): Имя файла в каталоге загрузок
+
+    Returns:
+        str: Имя исходного файла без расширения или None, если это не вариант
+    """
+    parts = name.rsplit('.', 2)
+    if len(parts) == 3 and parts[1] in VARIANTS and parts[2] in FORMATS:
+        return parts[0]
+    return None
+
+
+def save_image(image, path, **options):
+    """Атомарная запись изображения через уникальный временный файл в том же каталоге
+
+    Одновременная обработка одного и того же файла несколькими потоками
+    или процессами не мешает друг другу: каждый пишет свой временный
+    файл и заменяет целевой одной операцией, поэтому читатели никогда не
+    видят наполовину записанный файл.
+
+    Args:
+        image (PIL.Image.Image): Изображение
+        path (str): Путь к итоговому файлу
+        **options: Параметры ``Image.save`` (обязательно ``format``)
+
+    Raises:
+        OSError: Если файл не удалось записать; временный файл удаляется
+    """
+    directory, filename = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def process_image(path):
+    """Проверка изображения, удаление метаданных и создание вариантов
+
+    Исходный файл пересохраняется без EXIF и прочих метаданных (с учётом
+    ориентации), рядом с ним создаются варианты small/medium/large
+    в форматах WebP и JPEG. Повторная или одновременная обработка того же
+    файла безопасна.
+
+    Args:
+        path (str): Путь к исходному файлу
+
+    Raises:
+        InvalidImage: Если файл не удаётся прочитать как изображение
+        OSError: Если файл отсутствует или не удалось записать результат;
+            содержимое при этом не проверено, и обработку можно повторить
+    """
+    # Ошибка открытия самого файла — не признак негодного содержимого
+    with open(path, 'rb') as source:
+        try:
+            with PILImage.open(source) as probe:
+                probe.verify()
+            source.seek(0)
+            with PILImage.open(source) as original:
+                if original.width * original.height > MAX_PIXELS:
+                    raise InvalidImage('Слишком большое изображение')
+                source_format = original.format
+                image = ImageOps.exif_transpose(original)
+                image.load()
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise InvalidImage(str(e)) from e
+
+    if source_format in ('JPEG', 'PNG', 'WEBP'):
+        # Пересохранение без метаданных
+        save_image(image, path, format=source_format)
+
+    rgb = image.convert('RGB') if image.mode not in ('RGB', 'L') else image
+    directory, filename = os.path.split(path)
+    for size, max_width in VARIANTS.items():
+        variant = rgb.copy()
+        variant.thumbnail((max_width, max_width * 4), PILImage.LANCZOS)
+        for extension, options in FORMATS.items():
+            save_image(variant, os.path.join(directory, variant_filename(filename, size, extension)), **options)
+
+
+class ImagePipeline:
+    """Расширение Flask, обрабатывающее изображения в пуле фоновых потоков
+
+    Количество потоков задаётся ``IMAGE_PIPELINE_WORKERS``. После обработки
+    вызывается ``on_done(filename, ok)`` в контексте приложения, из
+    которого изображение поставлено в очередь: ``ok=False`` означает, что
+    содержимое не является допустимым изображением. При прочих ошибках
+    (нет файла, не удалось записать) ``on_done`` не вызывается, и
+    изображение остаётся необработанным до повторной попытки.
+    """
+
+    def __init__(self, app=None, on_done=None):
+        self.on_done = on_done
+        self._executor = None
+        if app is not None:
+            self.init_app(app, on_done)
+
+    def init_app(self, app, on_done=None):
+        """Подключение конвейера к приложению
+
+        Args:
+            app (Flask): Приложение
+            on_done (callable, optional): Обработчик результата
+        """
+        app.config.setdefault('IMAGE_PIPELINE_WORKERS', 2)
+        # Синхронная обработка (например, в тестах)
+        app.config.setdefault('IMAGE_PIPELINE_SYNC', False)
+        self.on_done = on_done or self.on_done
+        app.extensions['image_pipeline'] = self
+
+    def submit(self, path):
+        """Постановка изображения в очередь обработки
+
+        Args:
+            path (str): Путь к загруженному файлу
+
+        Returns:
+            Future: Результат обработки или None при синхронном режиме
+        """
+        app = current_app._get_current_object()
+        if app.config['IMAGE_PIPELINE_SYNC']:
+            self._process(app, path)
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=app.config['IMAGE_PIPELINE_WORKERS'],
+                thread_name_prefix='image-pipeline'
+            )
+        return self._executor.submit(self._process, app, path)
+
+    def _process(self, app, path):
+        ok = True
+        try:
+            process_image(path)
+        except InvalidImage:
+            ok = False
+            app.logger.warning('Отклонено изображение %s', path)
+        except Exception:
+            app.logger.exception('Ошибка обработки изображения %s', path)
+            return False
+        if self.on_done is not None:
+            with app.app_context():
+                self.on_done(os.path.basename(path), ok)
+        return ok
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""Фоновая очередь задач с повторами и таблицей «мёртвых» задач"""
+import heapq
+import importlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from flask import current_app
+
+
+class Job:
+    """Задача, выданная обработчику"""
+
+    __slots__ = ('id', 'name', 'payload', 'attempts')
+
+    def __init__(self, id, name, payload, attempts):
+        self.id = id
+        self.name = name
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} попытка {self.attempts}>'
+
+
+class MemoryBackend:
+    """Очередь в памяти процесса: задачи теряются при перезапуске"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._ready = []  # куча (run_at, id)
+        self._jobs = {}  # id -> [name, payload, attempts, last_error, run_at]
+        self._leased = {}  # id -> locked_until
+        self._dead = []
+
+    def push(self, name, payload, run_at):
+        with self._lock:
+            job_id = next(self._ids)
+            self._jobs[job_id] = [name, payload, 0, None, run_at]
+            heapq.heappush(self._ready, (run_at, job_id))
+            return job_id
+
+    def claim(self, now, lease):
+        with self._lock:
+            # Задачи упавших обработчиков возвращаются после истечения аренды
+            for job_id, locked_until in list(self._leased.items()):
+                if locked_until <= now:
+                    del self._leased[job_id]
+                    heapq.heappush(self._ready, (now, job_id))
+            if not self._ready or self._ready[0][0] > now:
+                return None
+            _, job_id = heapq.heappop(self._ready)
+            entry = self._jobs[job_id]
+            entry[2] += 1
+            self._leased[job_id] = now + lease
+            return Job(job_id, entry[0], entry[1], entry[2])
+
+    def complete(self, job_id):
+        with self._lock:
+            self._leased.pop(job_id, None)
+            self._jobs.pop(job_id, None)
+
+    def retry(self, job_id, error, run_at):
+        with self._lock:
+            self._leased.pop(job_id, None)
+            entry = self._jobs[job_id]
+            entry[3], entry[4] = error, run_at
+            heapq.heappush(self._ready, (run_at, job_id))
+
+    def bury(self, job_id, error, now):
+        with self._lock:
+            self._leased.pop(job_id, None)
+            name, payload, attempts, _, _ = self._jobs.pop(job_id)
+            self._dead.append({
+                'id': job_id, 'name': name, 'payload': payload,
+                'attempts': attempts, 'error': error, 'failed_at': now,
+            })
+
+    def pending(self):
+        with self._lock:
+            return [
+                {'id': job_id, 'name': name, 'payload': payload, 'attempts': attempts,
+                 'error': error, 'run_at': run_at, 'leased': job_id in self._leased}
+                for job_id, (name, payload, attempts, error, run_at) in sorted(self._jobs.items())
+            ]
+
+    def dead(self):
+        with self._lock:
+            return list(self._dead)
+
+    def revive(self, job_ids, now):
+        with self._lock:
+            revived = [job for job in self._dead if job_ids is None or job['id'] in job_ids]
+            self._dead = [job for job in self._dead if job not in revived]
+        for job in revived:
+            self.push(job['name'], job['payload'], now)
+        return len(revived)
+
+    def purge_dead(self):
+        with self._lock:
+            count = len(self._dead)
+            self._dead.clear()
+            return count
+
+
+class SQLiteBackend:
+    """Очередь в отдельном файле SQLite, общая для всех процессов на одной машине
+
+    Задача выдаётся в транзакции BEGIN IMMEDIATE и арендуется на время
+    lease; если процесс упал, не завершив её, задача снова становится
+    доступной после истечения аренды.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS job ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, run_at REAL NOT NULL, locked_until REAL, '
+            'last_error TEXT, created_at REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_job_run_at ON job (run_at)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS dead_job ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER NOT NULL, name TEXT NOT NULL, payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL, error TEXT, failed_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        # После fork соединение родителя использовать нельзя
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def push(self, name, payload, run_at):
+        cursor = self._connect().execute(
+            'INSERT INTO job (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)',
+            (name, json.dumps(payload), run_at, time.time())
+        )
+        return cursor.lastrowid
+
+    def claim(self, now, lease):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT id, name, payload, attempts FROM job '
+                'WHERE run_at <= ? AND (locked_until IS NULL OR locked_until <= ?) '
+                'ORDER BY run_at, id LIMIT 1',
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    'UPDATE job SET attempts = attempts + 1, locked_until = ? WHERE id = ?',
+                    (now + lease, row[0])
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1)
+
+    def complete(self, job_id):
+        self._connect().execute('DELETE FROM job WHERE id = ?', (job_id,))
+
+    def retry(self, job_id, error, run_at):
+        self._connect().execute(
+            'UPDATE job SET locked_until = NULL, last_error = ?, run_at = ? WHERE id = ?',
+            (error, run_at, job_id)
+        )
+
+    def bury(self, job_id, error, now):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT INTO dead_job (job_id, name, payload, attempts, error, failed_at) '
+                'SELECT id, name, payload, attempts, ?, ? FROM job WHERE id = ?',
+                (error, now, job_id)
+            )
+            connection.execute('DELETE FROM job WHERE id = ?', (job_id,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def pending(self):
+        now = time.time()
+        rows = self._connect().execute(
+            'SELECT id, name, payload, attempts, last_error, run_at, locked_until FROM job ORDER BY id'
+        ).fetchall()
+        return [
+            {'id': row[0], 'name': row[1], 'payload': json.loads(row[2]), 'attempts': row[3],
+             'error': row[4], 'run_at': row[5], 'leased': row[6] is not None and row[6] > now}
+            for row in rows
+        ]
+
+    def dead(self):
+        rows = self._connect().execute(
+            'SELECT id, name, payload, attempts, error, failed_at FROM dead_job ORDER BY id'
+        ).fetchall()
+        return [
+            {'id': row[0], 'name': row[1], 'payload': json.loads(row[2]), 'attempts': row[3],
+             'error': row[4], 'failed_at': row[5]}
+            for row in rows
+        ]
+
+    def revive(self, job_ids, now):
+        connection = self._connect()
+        where, params = '', ()
+        if job_ids is not None:
+            where = f' WHERE id IN ({", ".join("?" * len(job_ids))})'
+            params = tuple(job_ids)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(
+                'INSERT INTO job (name, payload, run_at, created_at) '
+                f'SELECT name, payload, ?, ? FROM dead_job{where}',
+                (now, now) + params
+            )
+            connection.execute(f'DELETE FROM dead_job{where}', params)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount
+
+    def purge_dead(self):
+        return self._connect().execute('DELETE FROM dead_job').rowcount
+
+
+def _load_backend(app):
+    """Создание хранилища по настройке JOB_QUEUE_BACKEND
+
+    Поддерживаются 'memory', 'sqlite' и путь к своему классу вида
+    'module:Class' (класс получает приложение).
+    """
+    name = app.config['JOB_QUEUE_BACKEND']
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(app.config['JOB_QUEUE_PATH'])
+    module_name, class_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)(app)
+
+
+class JobQueue:
+    """Расширение Flask: фоновые задачи в пуле потоков процесса
+
+    Обработчики регистрируются декоратором ``task(name)`` и получают
+    аргументы задачи в контексте приложения. Упавшая задача повторяется
+    с экспоненциальной задержкой ``JOB_RETRY_DELAY * 2 ** (попытка - 1)``,
+    после ``JOB_MAX_ATTEMPTS`` попыток переносится в «мёртвые». Задача
+    может выполниться повторно (например, если процесс упал во время её
+    выполнения), поэтому обработчики должны быть идемпотентными.
+
+    Обработчики общие, а хранилище и рабочие потоки у каждого приложения
+    свои; методы работают с очередью текущего приложения. Рабочие потоки
+    запускаются первым запросом процесса (или первой постановкой задачи),
+    поэтому задачи, оставшиеся в хранилище после перезапуска, выполняются
+    и без новых постановок.
+    """
+
+    def __init__(self, app=None):
+        self.handlers = {}
+        self._backends = weakref.WeakKeyDictionary()
+        # Приложение -> (pid, событие пробуждения, потоки)
+        self._workers = weakref.WeakKeyDictionary()
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение очереди к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('JOB_QUEUE_BACKEND', 'sqlite')
+        app.config.setdefault('JOB_QUEUE_PATH', os.path.join(app.instance_path, 'jobs.db'))
+        app.config.setdefault('JOB_QUEUE_WORKERS', 2)
+        # Синхронное выполнение (например, в тестах)
+        app.config.setdefault('JOB_QUEUE_SYNC', False)
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_RETRY_DELAY', 10)
+        app.config.setdefault('JOB_LEASE', 300)
+        app.config.setdefault('JOB_POLL_INTERVAL', 5)
+        app.extensions['job_queue'] = self
+        app.before_request(self._start_workers)
+
+    def _get_backend(self, app=None):
+        app = app or current_app._get_current_object()
+        backend = self._backends.get(app)
+        if backend is None:
+            backend = self._backends.setdefault(app, _load_backend(app))
+        return backend
+
+    def task(self, name):
+        """Декоратор обработчика задач с именем name
+
+        Args:
+            name (str): Имя типа задачи
+
+        Returns:
+            callable: Декоратор
+        """
+        def decorator(func):
+            self.handlers[name] = func
+            return func
+        return decorator
+
+    def enqueue(self, name, delay=0, **payload):
+        """Постановка задачи в очередь текущего приложения
+
+        Args:
+            name (str): Имя зарегистрированного обработчика
+            delay (float): Задержка перед выполнением, секунды
+            **payload: Аргументы обработчика (должны сериализоваться в JSON)
+
+        Returns:
+            int: ID задачи
+
+        Raises:
+            KeyError: Если обработчик не зарегистрирован
+        """
+        if name not in self.handlers:
+            raise KeyError(f'Неизвестная задача: {name}')
+        app = current_app._get_current_object()
+        job_id = self._get_backend(app).push(name, payload, time.time() + delay)
+        if app.config['JOB_QUEUE_SYNC']:
+            self.drain()
+        else:
+            self._ensure_workers(app).set()
+        return job_id
+
+    def run_next(self, app=None):
+        """Выполнение одной готовой задачи в текущем потоке
+
+        Args:
+            app (Flask, optional): Приложение; по умолчанию текущее
+
+        Returns:
+            bool: True, если задача была, иначе False
+        """
+        app = app or current_app._get_current_object()
+        backend = self._get_backend(app)
+        now = time.time()
+        job = backend.claim(now, app.config['JOB_LEASE'])
+        if job is None:
+            return False
+        try:
+            with app.app_context():
+                self.handlers[job.name](**job.payload)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            if job.attempts >= app.config['JOB_MAX_ATTEMPTS'] or job.name not in self.handlers:
+                app.logger.exception('Задача %r перенесена в мёртвые', job)
+                backend.bury(job.id, error, time.time())
+            else:
+                delay = app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+                app.logger.warning('Задача %r упала (%s), повтор через %s с', job, error, delay)
+                backend.retry(job.id, error, time.time() + delay)
+        else:
+            backend.complete(job.id)
+        return True
+
+    def drain(self):
+        """Выполнение всех готовых задач в текущем потоке
+
+        Returns:
+            int: Количество выполненных попыток
+        """
+        count = 0
+        while self.run_next():
+            count += 1
+        return count
+
+    def _start_workers(self):
+        """Запуск рабочих потоков при запросе к приложению, если очередь асинхронная"""
+        app = current_app._get_current_object()
+        if not app.config['JOB_QUEUE_SYNC']:
+            self._ensure_workers(app)
+
+    def _ensure_workers(self, app):
+        """Запуск рабочих потоков приложения, если они ещё не запущены
+
+        Returns:
+            threading.Event: Событие пробуждения потоков приложения
+        """
+        # Потоки не переживают fork: рабочий процесс Gunicorn запускает свои
+        workers = self._workers.get(app)
+        if workers is not None and workers[0] == os.getpid() and all(thread.is_alive() for thread in workers[2]):
+            return workers[1]
+        with self._start_lock:
+            workers = self._workers.get(app)
+            if workers is not None and workers[0] == os.getpid() and all(thread.is_alive() for thread in workers[2]):
+                return workers[1]
+            wakeup = threading.Event()
+            threads = [
+                threading.Thread(target=self._work, args=(app, wakeup), name=f'job-queue-{i}', daemon=True)
+                for i in range(app.config['JOB_QUEUE_WORKERS'])
+            ]
+            self._workers[app] = (os.getpid(), wakeup, threads)
+            for thread in threads:
+                thread.start()
+            return wakeup
+
+    def _work(self, app, wakeup):
+        while True:
+            # Сброс до проверки очереди: сигнал от enqueue во время проверки не теряется
+            wakeup.clear()
+            try:
+                if self.run_next(app):
+                    continue
+            except Exception:
+                app.logger.exception('Ошибка очереди задач')
+            wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+
+    def pending(self):
+        """Задачи в очереди (в том числе ожидающие повтора и выполняемые)"""
+        return self._get_backend().pending()
+
+    def dead(self):
+        """Задачи, исчерпавшие попытки"""
+        return self._get_backend().dead()
+
+    def revive(self, job_ids=None):
+        """Возврат мёртвых задач в очередь
+
+        Args:
+            job_ids (list, optional): ID задач; по умолчанию все
+
+        Returns:
+            int: Количество возвращённых задач
+        """
+        return self._get_backend().revive(job_ids, time.time())
+
+    def purge_dead(self):
+        """Удаление всех мёртвых задач
+
+        Returns:
+            int: Количество удалённых задач
+        """
+        return self._get_backend().purge_dead()
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""Метрики запросов в формате Prometheus и журнал медленных запросов"""
+import hmac
+import importlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+
+from flask import Response, abort, before_render_template, current_app, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger('forum.metrics')
+
+# Границы гистограммы длительности запроса, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_STATEMENT_LENGTH = 300
+
+# Имя: (тип, описание, метки)
+METRICS = {
+    'forum_requests_total': (
+        'counter', 'Обработанные HTTP-запросы', ('endpoint', 'method', 'status')),
+    'forum_request_duration_seconds': (
+        'histogram', 'Время обработки HTTP-запроса', ('endpoint', 'method')),
+    'forum_slow_requests_total': (
+        'counter', 'Запросы дольше METRICS_SLOW_REQUEST_MS', ('endpoint',)),
+    'forum_sampled_requests_total': (
+        'counter', 'Запросы, попавшие в выборку детальных замеров', ('endpoint',)),
+    'forum_sampled_request_seconds_total': (
+        'counter', 'Суммарное время запросов из выборки', ('endpoint',)),
+    'forum_sql_queries_total': (
+        'counter', 'SQL-запросы в запросах из выборки', ('endpoint',)),
+    'forum_sql_duration_seconds_total': (
+        'counter', 'Время SQL-запросов в запросах из выборки', ('endpoint',)),
+    'forum_slow_queries_total': (
+        'counter', 'SQL-запросы дольше METRICS_SLOW_QUERY_MS в запросах из выборки', ('endpoint',)),
+    'forum_template_render_seconds_total': (
+        'counter', 'Время рендеринга шаблонов в запросах из выборки', ('endpoint',)),
+}
+
+_listeners_installed = False
+
+
+class RequestSample:
+    """Детальные замеры одного запроса из выборки"""
+
+    __slots__ = ('sql_count', 'sql_time', 'render_time', 'render_started', 'slow_queries', 'slow_query_ms')
+
+    def __init__(self, slow_query_ms):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.slow_queries = 0
+        self.slow_query_ms = slow_query_ms
+
+
+def _current_sample():
+    return g.get('metrics_sample') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_sample() is not None:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sample = _current_sample()
+    started = conn.info.get('metrics_started')
+    if sample is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    sample.sql_count += 1
+    sample.sql_time += elapsed
+    if elapsed * 1000 >= sample.slow_query_ms:
+        sample.slow_queries += 1
+        logger.warning(
+            'Медленный SQL-запрос %.1f мс (%s): %s',
+            elapsed * 1000, request.endpoint, ' '.join(statement.split())[:SLOW_STATEMENT_LENGTH]
+        )
+
+
+def _install_listeners():
+    """Однократная подписка на выполнение запросов всех движков"""
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+def _before_render(sender, template, context, **extra):
+    sample = _current_sample()
+    if sample is not None:
+        sample.render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    sample = _current_sample()
+    if sample is not None and sample.render_started is not None:
+        sample.render_time += time.perf_counter() - sample.render_started
+        sample.render_started = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class MetricsRegistry:
+    """Счётчики и гистограммы процесса с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, value=1.0):
+        """Увеличение счётчика
+
+        Args:
+            name (str): Имя метрики
+            labels (tuple): Значения меток
+            value (float): Приращение
+        """
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, name, labels, value):
+        """Добавление наблюдения в гистограмму с границами DURATION_BUCKETS
+
+        Args:
+            name (str): Имя метрики
+            labels (tuple): Значения меток
+            value (float): Наблюдение, секунды
+        """
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            buckets, total, count = series.get(labels) or ([0] * len(DURATION_BUCKETS), 0.0, 0)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    buckets[index] += 1
+            series[labels] = (buckets, total + value, count + 1)
+
+    def drain(self):
+        """Снятие накопленных значений с обнулением реестра
+
+        Returns:
+            list: Строки (имя, метки в JSON, поле, приращение); поле пустое
+            у счётчиков, 'sum', 'count' или 'b<номер границы>' у гистограмм
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        rows = []
+        for name, series in counters.items():
+            rows.extend((name, json.dumps(labels), '', value) for labels, value in series.items())
+        for name, series in histograms.items():
+            for labels, (buckets, total, count) in series.items():
+                key = json.dumps(labels)
+                rows.append((name, key, 'sum', total))
+                rows.append((name, key, 'count', count))
+                rows.extend((name, key, f'b{index}', observed) for index, observed in enumerate(buckets))
+        return rows
+
+    def merge(self, rows):
+        """Добавление значений в формате drain
+
+        Args:
+            rows (iterable): Строки (имя, метки в JSON, поле, приращение)
+        """
+        with self._lock:
+            for name, key, field, value in rows:
+                labels = tuple(json.loads(key))
+                if not field:
+                    series = self._counters.setdefault(name, {})
+                    series[labels] = series.get(labels, 0.0) + value
+                    continue
+                series = self._histograms.setdefault(name, {})
+                buckets, total, count = series.get(labels) or ([0] * len(DURATION_BUCKETS), 0.0, 0)
+                if field == 'sum':
+                    total += value
+                elif field == 'count':
+                    count += int(value)
+                else:
+                    buckets[int(field[1:])] += int(value)
+                series[labels] = (buckets, total, count)
+
+    def value(self, name, labels):
+        """Текущее значение счётчика"""
+        with self._lock:
+            return self._counters.get(name, {}).get(labels, 0.0)
+
+    def clear(self):
+        """Сброс всех значений"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Все метрики из METRICS в текстовом формате Prometheus 0.0.4
+
+        Returns:
+            str: Текст для ответа /metrics
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, label_names) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'histogram':
+                    bucket_names = label_names + ('le',)
+                    for labels, (buckets, total, count) in sorted(self._histograms.get(name, {}).items()):
+                        for bound, observed in zip(DURATION_BUCKETS, buckets):
+                            lines.append(f'{name}_bucket{_labels(bucket_names, labels + (bound,))} {observed}')
+                        lines.append(f'{name}_bucket{_labels(bucket_names, labels + ("+Inf",))} {count}')
+                        lines.append(f'{name}_sum{_labels(label_names, labels)} {total:.6f}')
+                        lines.append(f'{name}_count{_labels(label_names, labels)} {count}')
+                else:
+                    for labels, value in sorted(self._counters.get(name, {}).items()):
+                        lines.append(f'{name}{_labels(label_names, labels)} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+class SQLiteStore:
+    """Значения метрик в отдельном файле SQLite, общие для всех процессов на одной машине
+
+    Процессы копят приращения в своём реестре и прибавляют их к значениям
+    в файле, поэтому ``/metrics`` из любого рабочего процесса Gunicorn
+    отдаёт сумму по всем процессам, и счётчики не убывают между опросами.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS metric ('
+            'name TEXT NOT NULL, labels TEXT NOT NULL, field TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (name, labels, field))'
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        # После fork соединение родителя использовать нельзя
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def add(self, rows):
+        """Прибавление приращений одной транзакцией
+
+        Args:
+            rows (list): Строки в формате MetricsRegistry.drain
+        """
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO metric (name, labels, field, value) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (name, labels, field) DO UPDATE SET value = value + excluded.value',
+                rows
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def load(self):
+        """Текущие значения всех процессов
+
+        Returns:
+            MetricsRegistry: Реестр со значениями из файла
+        """
+        registry = MetricsRegistry()
+        registry.merge(self._connect().execute('SELECT name, labels, field, value FROM metric'))
+        return registry
+
+    def clear(self):
+        self._connect().execute('DELETE FROM metric')
+
+
+def _load_store(app):
+    """Общее хранилище метрик по настройке METRICS_BACKEND
+
+    'memory' — без общего хранилища (значения только в памяти процесса),
+    'sqlite' или путь к своему классу вида 'module:Class' (класс получает
+    приложение и должен реализовать add/load/clear).
+    """
+    name = app.config['METRICS_BACKEND']
+    if name == 'memory':
+        return None
+    if name == 'sqlite':
+        return SQLiteStore(app.config['METRICS_DB_PATH'])
+    module_name, class_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)(app)
+
+
+class RequestMetrics:
+    """Расширение Flask: метрики запросов, выборочные замеры SQL и шаблонов
+
+    Включается настройкой ``METRICS_ENABLED``. Число и длительность
+    считаются для каждого запроса; время и число SQL-запросов и время
+    рендеринга шаблонов замеряются только для доли ``METRICS_SAMPLE_RATE``
+    запросов, поэтому накладные расходы остаются малыми. Запросы дольше
+    ``METRICS_SLOW_REQUEST_MS`` и SQL-запросы из выборки дольше
+    ``METRICS_SLOW_QUERY_MS`` записываются в журнал ``forum.metrics``.
+    Метрики отдаются по адресу ``METRICS_PATH``; если задан
+    ``METRICS_TOKEN``, требуется заголовок ``Authorization: Bearer <токен>``.
+
+    Значения копятся в памяти процесса, у каждого приложения отдельно.
+    При ``METRICS_BACKEND='sqlite'`` они раз в ``METRICS_FLUSH_INTERVAL``
+    секунд и перед ответом ``/metrics`` переносятся в общий файл
+    ``METRICS_DB_PATH``, и ответ содержит сумму по всем процессам;
+    при ``'memory'`` ответ отражает только обработавший его процесс.
+    """
+
+    def __init__(self, app=None):
+        self._registries = weakref.WeakKeyDictionary()
+        self._stores = weakref.WeakKeyDictionary()
+        self._flushed = weakref.WeakKeyDictionary()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение метрик к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_SAMPLE_RATE', 0.1)
+        app.config.setdefault('METRICS_SLOW_REQUEST_MS', 500)
+        app.config.setdefault('METRICS_SLOW_QUERY_MS', 100)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_BACKEND', 'memory')
+        app.config.setdefault('METRICS_DB_PATH', os.path.join(app.instance_path, 'metrics.db'))
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+        app.extensions['request_metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        _install_listeners()
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.export)
+
+    def registry(self, app=None):
+        """Реестр значений приложения, ещё не перенесённых в общее хранилище
+
+        Args:
+            app (Flask, optional): Приложение; по умолчанию текущее
+
+        Returns:
+            MetricsRegistry: Реестр процесса
+        """
+        app = app or current_app._get_current_object()
+        registry = self._registries.get(app)
+        if registry is None:
+            registry = self._registries.setdefault(app, MetricsRegistry())
+        return registry
+
+    def _get_store(self, app):
+        if app not in self._stores:
+            self._stores.setdefault(app, _load_store(app))
+        return self._stores[app]
+
+    def flush(self, app=None):
+        """Перенос накопленных значений процесса в общее хранилище
+
+        При ошибке записи значения возвращаются в реестр процесса.
+
+        Args:
+            app (Flask, optional): Приложение; по умолчанию текущее
+        """
+        app = app or current_app._get_current_object()
+        store = self._get_store(app)
+        if store is None:
+            return
+        self._flushed[app] = time.monotonic()
+        registry = self.registry(app)
+        rows = registry.drain()
+        if not rows:
+            return
+        try:
+            store.add(rows)
+        except Exception:
+            registry.merge(rows)
+            logger.exception('Не удалось записать метрики в общее хранилище')
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        if random.random() < current_app.config['METRICS_SAMPLE_RATE']:
+            g.metrics_sample = RequestSample(current_app.config['METRICS_SLOW_QUERY_MS'])
+
+    def _finish(self, response):
+        started = g.pop('metrics_started', None)
+        sample = g.pop('metrics_sample', None)
+        if started is None or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        app = current_app._get_current_object()
+        registry = self.registry(app)
+        registry.inc('forum_requests_total', (endpoint, request.method, str(response.status_code)))
+        registry.observe('forum_request_duration_seconds', (endpoint, request.method), elapsed)
+
+        if sample is not None:
+            labels = (endpoint,)
+            registry.inc('forum_sampled_requests_total', labels)
+            registry.inc('forum_sampled_request_seconds_total', labels, elapsed)
+            registry.inc('forum_sql_queries_total', labels, sample.sql_count)
+            registry.inc('forum_sql_duration_seconds_total', labels, sample.sql_time)
+            registry.inc('forum_slow_queries_total', labels, sample.slow_queries)
+            registry.inc('forum_template_render_seconds_total', labels, sample.render_time)
+
+        if elapsed * 1000 >= current_app.config['METRICS_SLOW_REQUEST_MS']:
+            registry.inc('forum_slow_requests_total', (endpoint,))
+            details = ''
+            if sample is not None:
+                details = (
+                    f', SQL: {sample.sql_count} за {sample.sql_time * 1000:.1f} мс'
+                    f', шаблоны: {sample.render_time * 1000:.1f} мс'
+                )
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.1f мс, статус %s%s',
+                request.method, request.full_path.rstrip('?'), endpoint, elapsed * 1000,
+                response.status_code, details
+            )
+        if time.monotonic() - self._flushed.get(app, 0.0) >= app.config['METRICS_FLUSH_INTERVAL']:
+            self.flush(app)
+        return response
+
+    def export(self):
+        """Представление с метриками: сумма по процессам из общего хранилища или значения процесса
+
+        Returns:
+            Response: Текст в формате Prometheus
+
+        Raises:
+            Forbidden: Если задан METRICS_TOKEN, а запрос его не содержит
+        """
+        token = current_app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(403)
+        app = current_app._get_current_object()
+        store = self._get_store(app)
+        if store is None:
+            registry = self.registry(app)
+        else:
+            self.flush(app)
+            registry = store.load()
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,24 @@
+"""marketplace sort indexes
+
+Revision ID: 4f1c2a9b7e30
+Revises: dd873750a25b
+Create Date: 2026-10-18 14:02:31.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9b7e30'
+down_revision = 'dd873750a25b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_section_views', 'post', ['section', 'views'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_section_views', table_name='post')
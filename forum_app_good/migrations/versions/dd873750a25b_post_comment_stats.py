@@ -0,0 +1,46 @@
+"""post comment stats
+
+Revision ID: dd873750a25b
+Revises: 6ca852c9e975
+Create Date: 2026-10-18 11:49:06.512347
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd873750a25b'
+down_revision = '6ca852c9e975'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_comment_at', sa.DateTime(), nullable=True))
+
+    # Заполнение новых полей по существующим комментариям
+    op.execute(
+        'UPDATE post SET '
+        'comment_count = (SELECT count(*) FROM comment WHERE comment.post_id = post.id), '
+        'last_comment_at = (SELECT max(created_at) FROM comment WHERE comment.post_id = post.id)'
+    )
+
+    op.create_index(
+        'ix_post_last_activity', 'post',
+        [sa.text('coalesce(last_comment_at, created_at)'), 'id'], unique=False
+    )
+    op.create_index(
+        'ix_post_section_last_activity', 'post',
+        ['section', sa.text('coalesce(last_comment_at, created_at)'), 'id'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_post_section_last_activity', table_name='post')
+    op.drop_index('ix_post_last_activity', table_name='post')
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('last_comment_at')
+        batch_op.drop_column('comment_count')
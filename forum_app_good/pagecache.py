@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Кеш отрендеренных страниц для анонимных пользователей с инвалидацией по тегам"""
+import hashlib
+import importlib
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, g, request, session
+from flask_login import current_user
+
+
+class MemoryBackend:
+    """Хранилище в памяти процесса: ограниченный LRU со сроком жизни записей"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, tags, value = entry
+            if expires < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + ttl, frozenset(tags), value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            removed = 0
+            for tag in tags:
+                for key in self._tags.pop(tag, set()):
+                    removed += self._remove(key)
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return 0
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return 1
+
+
+class FileBackend:
+    """Хранилище в каталоге на диске, общее для всех процессов на одной машине
+
+    Записи лежат в файлах ``<hash>.page``, а для каждого тега создаётся
+    каталог ``tags/<hash тега>`` с пустыми файлами-ссылками на записи.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(os.path.join(directory, 'tags'), exist_ok=True)
+
+    @staticmethod
+    def _hash(value):
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def _path(self, key_hash):
+        return os.path.join(self.directory, key_hash + '.page')
+
+    def get(self, key):
+        path = self._path(self._hash(key))
+        try:
+            with open(path, 'rb') as f:
+                expires, tags, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            self._unlink(path)
+            return None
+        return value
+
+    def set(self, key, value, ttl, tags=()):
+        key_hash = self._hash(key)
+        path = self._path(key_hash)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((time.time() + ttl, tuple(tags), value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for tag in tags:
+            tag_dir = os.path.join(self.directory, 'tags', self._hash(tag))
+            os.makedirs(tag_dir, exist_ok=True)
+            open(os.path.join(tag_dir, key_hash), 'a').close()
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def invalidate(self, tags):
+        removed = 0
+        for tag in tags:
+            tag_dir = os.path.join(self.directory, 'tags', self._hash(tag))
+            try:
+                key_hashes = os.listdir(tag_dir)
+            except OSError:
+                continue
+            for key_hash in key_hashes:
+                removed += self._unlink(self._path(key_hash))
+                self._unlink(os.path.join(tag_dir, key_hash))
+        return removed
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.page'):
+                self._unlink(os.path.join(self.directory, name))
+
+    def _prune(self):
+        """Удаление самых старых записей сверх max_entries"""
+        entries = [
+            entry for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith('.page')
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            self._unlink(entry.path)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+
+def _load_backend(app):
+    """Создание хранилища по настройке PAGE_CACHE_BACKEND
+
+    Поддерживаются 'memory', 'file' и путь к своему классу вида
+    'module:Class' (класс получает приложение и должен реализовать
+    get/set/invalidate/clear).
+    """
+    name = app.config['PAGE_CACHE_BACKEND']
+    max_entries = app.config['PAGE_CACHE_MAX_ENTRIES']
+    if name == 'memory':
+        return MemoryBackend(max_entries)
+    if name == 'file':
+        return FileBackend(app.config['PAGE_CACHE_DIR'], max_entries)
+    module_name, class_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)(app)
+
+
+class PageCache:
+    """Расширение Flask для кеширования страниц анонимных пользователей
+
+    Ключ записи — endpoint, отсортированные параметры запроса и состояние
+    аутентификации. Представление помечает страницу тегами (например,
+    ``post:<id>``), а операции записи удаляют записи с нужными тегами.
+    Хранилище создаётся отдельно для каждого приложения при первом
+    обращении к кешу.
+    """
+
+    def __init__(self, app=None):
+        self._backends = weakref.WeakKeyDictionary()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение кеша к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        app.config.setdefault('PAGE_CACHE_TTL', 60)
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache'))
+        app.extensions['page_cache'] = self
+
+    def _get_backend(self):
+        app = current_app._get_current_object()
+        backend = self._backends.get(app)
+        if backend is None:
+            backend = self._backends.setdefault(app, _load_backend(app))
+        return backend
+
+    @staticmethod
+    def make_key():
+        """Ключ кеша для текущего запроса"""
+        args = urlencode(sorted(request.args.items(multi=True)))
+        auth = f'user:{current_user.get_id()}' if current_user.is_authenticated else 'anon'
+        return f'{request.endpoint}|{request.view_args}|{args}|{auth}'
+
+    def _can_cache(self):
+        return (
+            current_app.config['PAGE_CACHE_ENABLED']
+            and request.method == 'GET'
+            and not current_user.is_authenticated
+            and '_flashes' not in session
+        )
+
+    @staticmethod
+    def tag(*tags):
+        """Пометка текущей страницы тегами для последующей инвалидации"""
+        g.setdefault('page_cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags):
+        """Удаление всех страниц, помеченных любым из тегов
+
+        Returns:
+            int: Количество удалённых записей
+        """
+        if not current_app.config['PAGE_CACHE_ENABLED']:
+            return 0
+        return self._get_backend().invalidate(tags)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        self._get_backend().clear()
+
+    def cached(self, on_hit=None):
+        """Декоратор представления, кеширующий успешные HTML-ответы
+
+        Args:
+            on_hit (callable, optional): Вызывается с аргументами
+                представления при отдаче ответа из кеша
+
+        Returns:
+            callable: Декоратор
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self._can_cache():
+                    return view(**kwargs)
+                backend = self._get_backend()
+                key = self.make_key()
+                entry = backend.get(key)
+                if entry is not None:
+                    if on_hit is not None:
+                        on_hit(**kwargs)
+                    body, mimetype = entry
+                    response = Response(body, mimetype=mimetype)
+                    response.headers['X-Page-Cache'] = 'HIT'
+                    return response
+
+                response = current_app.make_response(view(**kwargs))
+                tags = g.pop('page_cache_tags', set())
+                if response.status_code == 200 and not response.direct_passthrough and not session.modified:
+                    backend.set(key, (response.get_data(), response.mimetype), current_app.config['PAGE_CACHE_TTL'], tags)
+                    response.headers['X-Page-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
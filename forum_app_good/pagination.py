@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Курсорная (keyset) пагинация лент постов"""
+import base64
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+COUNT_CACHE_SIZE = 256
+
+# Кеш количеств отдельно для каждого движка БД: приложения в одном процессе не видят чужих значений
+_count_caches = weakref.WeakKeyDictionary()
+_count_lock = threading.Lock()
+
+
+def encode_cursor(created_at, item_id):
+    """Кодирование позиции в ленте в строку для URL
+
+    Args:
+        created_at (datetime): Дата создания записи
+        item_id (int): ID записи
+
+    Returns:
+        str: Курсор в base64url
+    """
+    raw = f'{created_at.isoformat()}|{item_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбор курсора из URL
+
+    Args:
+        cursor (str): Курсор, созданный encode_cursor
+
+    Returns:
+        tuple: (created_at, id) или None, если курсор некорректен
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def cached_count(query, ttl):
+    """Количество строк запроса с кешированием в памяти процесса
+
+    Значения хранятся отдельно для каждого движка БД, к которому
+    привязана сессия запроса.
+
+    Args:
+        query: Запрос SQLAlchemy
+        ttl (float): Время жизни значения в секундах; 0 отключает подсчёт
+
+    Returns:
+        int: Количество строк или None, если подсчёт отключён
+    """
+    if not ttl:
+        return None
+    compiled = query.statement.compile()
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+    now = time.monotonic()
+    with _count_lock:
+        cache = _count_caches.setdefault(query.session.get_bind(), OrderedDict())
+        cached = cache.get(key)
+        if cached and cached[0] > now:
+            cache.move_to_end(key)
+            return cached[1]
+    total = query.order_by(None).count()
+    with _count_lock:
+        cache[key] = (now + ttl, total)
+        cache.move_to_end(key)
+        while len(cache) > COUNT_CACHE_SIZE:
+            cache.popitem(last=False)
+    return total
+
+
+class KeysetPagination:
+    """Страница ленты, выбранная по курсору (дата, id)
+
+    Вместо OFFSET и COUNT на каждый запрос выбирается per_page + 1 строк
+    после (или до) курсора, поэтому глубокие страницы не медленнее первой.
+    """
+
+    def __init__(self, items, per_page, has_prev, has_next, total=None, sort='created_at'):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.total = total
+        self.sort = sort
+
+    @property
+    def next_cursor(self):
+        """Курсор следующей (более старой) страницы"""
+        if not self.has_next or not self.items:
+            return None
+        last = self.items[-1]
+        return encode_cursor(getattr(last, self.sort), last.id)
+
+    @property
+    def prev_cursor(self):
+        """Курсор предыдущей (более новой) страницы"""
+        if not self.has_prev or not self.items:
+            return None
+        first = self.items[0]
+        return encode_cursor(getattr(first, self.sort), first.id)
+
+
+def keyset_paginate(query, model, per_page, after=None, before=None, count_ttl=0, sort='created_at'):
+    """Курсорная пагинация запроса по убыванию (sort, id)
+
+    Args:
+        query: Запрос SQLAlchemy по модели (без сортировки)
+        model: Модель с колонкой id и атрибутом-датой sort
+        per_page (int): Количество записей на странице
+        after (str, optional): Курсор — вернуть записи старше него
+        before (str, optional): Курсор — вернуть записи новее него
+        count_ttl (float): Время кеширования общего количества; 0 — не считать
+        sort (str): Имя атрибута модели с датой для сортировки (колонка
+            или hybrid-свойство)
+
+    Returns:
+        KeysetPagination: Страница с записями и курсорами соседних страниц
+    """
+    column = getattr(model, sort)
+    key = tuple_(column, model.id)
+    total = cached_count(query, count_ttl)
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    # Скалярная граница рядом со сравнением кортежей: SQLite не использует сравнение
+    # (sort, id) как диапазон индекса (особенно индекса по выражению) и иначе
+    # просматривает индекс с начала, а по одной колонке ищет в индексе сразу
+    if before_key is not None:
+        rows = query.filter(column >= before_key[0], key > before_key).order_by(
+            column.asc(), model.id.asc()
+        ).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPagination(items, per_page, has_prev=has_prev, has_next=True, total=total, sort=sort)
+
+    if after_key is not None:
+        query = query.filter(column <= after_key[0], key < after_key)
+    rows = query.order_by(column.desc(), model.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    return KeysetPagination(
+        rows[:per_page], per_page, has_prev=after_key is not None, has_next=has_next, total=total, sort=sort
+    )
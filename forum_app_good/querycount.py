@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Подсчёт SQL-запросов на запрос к приложению и контроль бюджета запросов"""
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Страница выполнила больше SQL-запросов, чем разрешено её бюджетом"""
+
+
+_listeners_installed = False
+_active_counters = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Учёт каждого выполняемого SQL-запроса"""
+    for counter in _active_counters:
+        counter.append(statement)
+    if has_app_context() and 'query_log' in g:
+        g.query_log.append(statement)
+
+
+def _install_listener():
+    """Однократная подписка на выполнение запросов всех движков"""
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        _listeners_installed = True
+
+
+@contextmanager
+def count_queries():
+    """Контекстный менеджер для подсчёта запросов внутри блока
+
+    Yields:
+        list: Тексты выполненных SQL-запросов
+    """
+    _install_listener()
+    statements = []
+    _active_counters.append(statements)
+    try:
+        yield statements
+    finally:
+        _active_counters.remove(statements)
+
+
+class QueryCounter:
+    """Расширение Flask, считающее SQL-запросы каждого HTTP-запроса
+
+    Бюджеты задаются в конфигурации ``QUERY_BUDGETS`` в виде словаря
+    ``{endpoint: максимум запросов}``. При ``QUERY_BUDGET_ENFORCE = True``
+    (например, в тестах) превышение бюджета приводит к исключению
+    ``QueryBudgetExceeded``.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Регистрация обработчиков в приложении
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('QUERY_BUDGETS', {})
+        app.config.setdefault('QUERY_BUDGET_ENFORCE', False)
+        _install_listener()
+        app.before_request(self._start)
+        app.after_request(self._check)
+
+    @staticmethod
+    def _start():
+        g.query_log = []
+
+    @staticmethod
+    def _check(response):
+        statements = g.pop('query_log', [])
+        if current_app.debug or current_app.testing:
+            response.headers['X-Query-Count'] = str(len(statements))
+        budget = current_app.config['QUERY_BUDGETS'].get(request.endpoint)
+        if current_app.config['QUERY_BUDGET_ENFORCE'] and budget is not None and len(statements) > budget:
+            raise QueryBudgetExceeded(
+                f'{request.endpoint}: {len(statements)} SQL-запросов при бюджете {budget}\n'
+                + '\n'.join(statements)
+            )
+        return response
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Проверка планов SQL-запросов страниц на полные сканирования таблиц"""
+import re
+
+from sqlalchemy import event
+
+
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$')
+# Курсорное условие keyset-пагинации: сравнение кортежей вида (sort, id) < (?, ?)
+_CURSOR_RE = re.compile(r'\)\s*[<>]=?\s*\(\?(?:,\s*\?)+\)')
+
+
+def find_full_scans(connection, statement, parameters, tables):
+    """Поиск полных сканирований в плане одного запроса
+
+    Просмотр таблицы по индексу (``SCAN ... USING INDEX``) допустим, пока в
+    запросе нет курсорного условия: с курсором такой план проходит индекс
+    от начала до позиции курсора, и глубокие страницы ленты становятся
+    медленнее первой, поэтому он тоже считается полным сканированием.
+
+    Args:
+        connection: Connection SQLAlchemy
+        statement (str): SQL-запрос
+        parameters: Параметры запроса в формате драйвера
+        tables (set): Имена таблиц, сканирование которых считается полным
+
+    Returns:
+        list: Строки плана с полными сканированиями
+    """
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    has_cursor = _CURSOR_RE.search(statement) is not None
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        match = _SCAN_RE.match(detail)
+        if match and match.group(1) in tables and (has_cursor or 'INDEX' not in match.group(2)):
+            scans.append(detail)
+    return scans
+
+
+def explain_requests(engine, tables, requests):
+    """Выполнение запросов к страницам и разбор планов их SELECT-запросов
+
+    Args:
+        engine: Engine SQLAlchemy приложения
+        tables (set): Имена проверяемых таблиц
+        requests (list): Пары (URL, функция выполнения запроса к URL)
+
+    Returns:
+        list: Кортежи (URL, SQL-запрос, список полных сканирований)
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    report = []
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for url, perform in requests:
+            captured.clear()
+            perform()
+            statements = list(captured)
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    report.append((url, statement, find_full_scans(connection, statement, parameters, tables)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return report
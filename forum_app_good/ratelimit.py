@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Ограничение частоты запросов (token bucket) по IP и пользователю"""
+import importlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from functools import wraps
+
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+LIMIT_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$')
+
+
+def parse_limit(limit):
+    """Разбор лимита вида '10/minute' или '20/5minutes'
+
+    Args:
+        limit (str): Лимит
+
+    Returns:
+        tuple: (ёмкость корзины, скорость пополнения в токенах в секунду)
+
+    Raises:
+        ValueError: Если строка не распознана
+    """
+    match = LIMIT_RE.match(limit)
+    if not match:
+        raise ValueError(f'Некорректный лимит: {limit}')
+    count, multiplier, period = match.groups()
+    seconds = PERIODS[period] * int(multiplier or 1)
+    return int(count), int(count) / seconds
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Корзины в памяти процесса; при нескольких процессах лимит действует в каждом отдельно"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, rate, now)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return False, (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return True, 0.0
+
+    def _prune(self, now):
+        """Удаление самых давних корзин: их состояние почти наверняка уже полное"""
+        oldest = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in oldest[:len(oldest) - self.max_keys // 2]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Корзины в отдельном файле SQLite, общие для всех процессов на одной машине
+
+    Каждое списание выполняется в транзакции BEGIN IMMEDIATE, поэтому
+    параллельные процессы не теряют обновления.
+    """
+
+    PRUNE_EVERY = 1000
+    MAX_IDLE = 86400
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._operations = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        # После fork соединение родителя использовать нельзя
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = time.time()
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*row, capacity, rate, now) if row else capacity
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            connection.execute(
+                'INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._operations += 1
+        if self._operations % self.PRUNE_EVERY == 0:
+            connection.execute('DELETE FROM bucket WHERE updated < ?', (now - self.MAX_IDLE,))
+        return (True, 0.0) if allowed else (False, (cost - tokens) / rate)
+
+    def clear(self):
+        self._connect().execute('DELETE FROM bucket')
+
+
+def _load_backend(app):
+    """Создание хранилища по настройке RATE_LIMIT_BACKEND
+
+    Поддерживаются 'memory', 'sqlite' и путь к своему классу вида
+    'module:Class' (класс получает приложение и должен реализовать
+    consume/clear).
+    """
+    name = app.config['RATE_LIMIT_BACKEND']
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(app.config['RATE_LIMIT_PATH'])
+    module_name, class_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)(app)
+
+
+class RateLimiter:
+    """Расширение Flask, ограничивающее частоту запросов к отдельным представлениям
+
+    Лимиты задаются в ``RATE_LIMITS`` по имени (``{'login': '10/minute'}``).
+    Для каждого запроса списывается токен из корзины IP-адреса и, если
+    пользователь известен, из корзины пользователя; при нехватке токенов
+    возвращается 429 с заголовком Retry-After.
+    """
+
+    def __init__(self, app=None):
+        self._backends = weakref.WeakKeyDictionary()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение ограничителя к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'ratelimit.db'))
+        app.config.setdefault('RATE_LIMITS', {})
+        app.extensions['rate_limiter'] = self
+
+    def _get_backend(self):
+        app = current_app._get_current_object()
+        backend = self._backends.get(app)
+        if backend is None:
+            backend = self._backends.setdefault(app, _load_backend(app))
+        return backend
+
+    def check(self, name, user_key=None):
+        """Списание токенов для текущего запроса
+
+        Args:
+            name (str): Имя лимита в RATE_LIMITS
+            user_key (str, optional): Идентификатор пользователя, если он
+                не вошёл в систему (например, имя при входе)
+
+        Raises:
+            TooManyRequests: Если лимит исчерпан
+        """
+        limit = current_app.config['RATE_LIMITS'].get(name)
+        if not current_app.config['RATE_LIMIT_ENABLED'] or not limit:
+            return
+        capacity, rate = parse_limit(limit)
+        keys = [f'{name}:ip:{request.remote_addr}']
+        if current_user.is_authenticated:
+            keys.append(f'{name}:user:{current_user.get_id()}')
+        elif user_key:
+            keys.append(f'{name}:user:{user_key}')
+
+        backend = self._get_backend()
+        retry_after = 0.0
+        for key in keys:
+            allowed, wait = backend.consume(key, capacity, rate)
+            if not allowed:
+                retry_after = max(retry_after, wait)
+        if retry_after:
+            raise TooManyRequests(retry_after=max(1, int(retry_after + 0.999)))
+
+    def limit(self, name, methods=('POST',), user_key=None):
+        """Декоратор представления с лимитом из RATE_LIMITS
+
+        Args:
+            name (str): Имя лимита
+            methods (tuple): HTTP-методы, к которым применяется лимит
+            user_key (callable, optional): Возвращает идентификатор
+                пользователя для анонимных запросов
+
+        Returns:
+            callable: Декоратор
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method in methods:
+                    self.check(name, user_key() if user_key else None)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
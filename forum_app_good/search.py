@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Полнотекстовый поиск по постам на базе SQLite FTS5"""
+import html
+import re
+import weakref
+
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+
+
+FTS_TABLE = 'post_fts'
+REBUILD_BATCH_SIZE = 500
+
+post_fts = table(FTS_TABLE, column('rowid'), column('title'), column('content'))
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Движки, в базе которых поисковая таблица уже проверена; объекты, а не URL:
+# у двух приложений с 'sqlite://' одинаковый URL, но разные базы
+_ready_engines = weakref.WeakSet()
+
+
+def is_supported(bind):
+    """Проверка, поддерживает ли подключение FTS5
+
+    Args:
+        bind: Engine или Connection SQLAlchemy
+
+    Returns:
+        bool: True для SQLite, иначе False
+    """
+    return bind.dialect.name == 'sqlite'
+
+
+def strip_html(content):
+    """Очистка HTML-содержимого поста перед индексацией
+
+    Удаляет теги вместе с атрибутами (в том числе встроенные
+    base64-изображения редактора) и раскрывает HTML-сущности.
+
+    Args:
+        content (str): HTML-содержимое поста
+
+    Returns:
+        str: Обычный текст
+    """
+    if not content:
+        return ''
+    return html.unescape(_TAG_RE.sub(' ', content))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Фильтр для автогенерации миграций: FTS-таблицы создаются не Alembic
+
+    Returns:
+        bool: False для поисковой таблицы и её служебных таблиц
+    """
+    return not (type_ == 'table' and name and name.startswith(FTS_TABLE))
+
+
+def build_match_query(search_query, columns=None):
+    """Построение безопасного выражения FTS5 MATCH из пользовательского ввода
+
+    Каждое слово превращается в префиксный терм, поэтому поиск работает
+    уже по мере набора. Спецсимволы синтаксиса FTS5 отбрасываются.
+
+    Args:
+        search_query (str): Строка поиска
+        columns (list, optional): Колонки индекса для поиска
+
+    Returns:
+        str: Выражение для MATCH или пустая строка, если слов нет
+    """
+    tokens = _TOKEN_RE.findall(search_query or '')
+    if not tokens:
+        return ''
+    expression = ' AND '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        expression = '{%s} : (%s)' % (' '.join(columns), expression)
+    return expression
+
+
+def ensure_index(connection):
+    """Создание FTS-таблицы, если её ещё нет в базе
+
+    При создании индекс сразу заполняется существующими постами.
+    Проверка выполняется один раз на каждый движок.
+
+    Args:
+        connection: Connection SQLAlchemy
+    """
+    engine = connection.engine
+    if engine in _ready_engines:
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    if not exists:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, content, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        rebuild_index(connection)
+    _ready_engines.add(engine)
+
+
+def rebuild_index(connection):
+    """Полная перестройка поискового индекса по таблице post
+
+    Args:
+        connection: Connection SQLAlchemy
+
+    Returns:
+        int: Количество проиндексированных постов
+    """
+    connection.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    total = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text('SELECT id, title, content FROM post WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': REBUILD_BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            text(f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)'),
+            [{'id': row.id, 'title': row.title, 'content': strip_html(row.content)} for row in rows]
+        )
+        total += len(rows)
+        last_id = rows[-1].id
+    return total
+
+
+def index_post(connection, post_id, title, content):
+    """Добавление или обновление поста в поисковом индексе
+
+    Args:
+        connection: Connection SQLAlchemy
+        post_id (int): ID поста
+        title (str): Заголовок поста
+        content (str): HTML-содержимое поста
+    """
+    if not is_supported(connection):
+        return
+    ensure_index(connection)
+    connection.execute(
+        text(f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)'),
+        {'id': post_id, 'title': title, 'content': strip_html(content)}
+    )
+
+
+def remove_post(connection, post_id):
+    """Удаление поста из поискового индекса
+
+    Args:
+        connection: Connection SQLAlchemy
+        post_id (int): ID поста
+    """
+    if not is_supported(connection):
+        return
+    ensure_index(connection)
+    connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': post_id})
+
+
+def apply_search(query, model, search_query, columns=('title', 'content')):
+    """Фильтрация и ранжирование запроса постов по строке поиска
+
+    На SQLite запрос соединяется с FTS-индексом и сортируется по BM25
+    (совпадения в заголовке весят больше). На других СУБД используется
+    прежний поиск через ILIKE.
+
+    Args:
+        query: Запрос SQLAlchemy по модели поста
+        model: Модель поста
+        search_query (str): Строка поиска
+        columns (tuple): Колонки для поиска ('title' и/или 'content')
+
+    Returns:
+        Query: Отфильтрованный и отсортированный по релевантности запрос
+    """
+    bind = query.session.get_bind()
+    if not is_supported(bind):
+        return query.filter(or_(*[getattr(model, name).ilike(f'%{search_query}%') for name in columns]))
+
+    match = build_match_query(search_query, columns)
+    if not match:
+        return query
+
+    if bind not in _ready_engines:
+        with bind.begin() as connection:
+            ensure_index(connection)
+
+    fts = literal_column(FTS_TABLE)
+    ranked = select(
+        post_fts.c.rowid.label('post_id'),
+        func.bm25(fts, 10.0, 1.0).label('rank')
+    ).where(fts.op('MATCH')(match)).subquery('search_rank')
+    return query.join(ranked, ranked.c.post_id == model.id).order_by(ranked.c.rank)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Сериализация моделей форума для JSON API
+
+Каждая функция явно перечисляет поля ответа и обращается только к уже
+загруженным атрибутам, поэтому сериализация не вызывает ленивых
+запросов, а в ответ не попадают служебные поля моделей.
+"""
+
+EMBEDS = frozenset({'author', 'images', 'comments'})
+
+
+class InvalidEmbed(ValueError):
+    """Запрошена неизвестная связь в параметре embed"""
+
+
+def parse_embed(value, allowed=EMBEDS):
+    """Разбор параметра embed вида 'author,images'
+
+    Args:
+        value (str): Значение параметра
+        allowed (frozenset): Допустимые связи
+
+    Returns:
+        frozenset: Запрошенные связи
+
+    Raises:
+        InvalidEmbed: Если указана связь не из allowed
+    """
+    names = frozenset(name.strip() for name in (value or '').split(',') if name.strip())
+    unknown = names - allowed
+    if unknown:
+        raise InvalidEmbed(
+            f'Неизвестные связи: {", ".join(sorted(unknown))}; доступны: {", ".join(sorted(allowed))}'
+        )
+    return names
+
+
+def iso(value):
+    """Дата в ISO 8601 или None"""
+    return value.isoformat() if value is not None else None
+
+
+def user_json(user):
+    """Публичные поля пользователя"""
+    return {'id': user.id, 'username': user.username}
+
+
+def comment_json(comment):
+    """Комментарий с автором (автор должен быть загружен заранее)"""
+    return {
+        'id': comment.id,
+        'text': comment.text,
+        'created_at': iso(comment.created_at),
+        'author': user_json(comment.author),
+    }
+
+
+def image_json(image, url, srcset):
+    """Изображение поста
+
+    Args:
+        image (Image): Изображение
+        url (callable): url(image) — URL варианта по умолчанию
+        srcset (callable): srcset(image) — srcset вариантов или пустая строка
+    """
+    return {'id': image.id, 'url': url(image), 'srcset': srcset(image) or None, 'processed': image.processed}
+
+
+def post_json(post, embed=frozenset(), content=False, image_url=None, image_srcset=None, comments=None):
+    """Пост с выбранными связями
+
+    Args:
+        post (Post): Пост; связи из embed должны быть загружены жадно
+        embed (frozenset): Связи для включения ('author', 'images', 'comments')
+        content (bool): Включить полный HTML-текст поста
+        image_url (callable): Построение URL изображения (нужно для 'images')
+        image_srcset (callable): Построение srcset изображения (нужно для 'images')
+        comments (list, optional): Комментарии для 'comments'
+
+    Returns:
+        dict: Данные для JSON-ответа
+    """
+    data = {
+        'id': post.id,
+        'title': post.title,
+        'section': post.section,
+        'price': post.price,
+        'created_at': iso(post.created_at),
+        'views': post.views,
+        'comment_count': post.comment_count,
+        'last_comment_at': iso(post.last_comment_at),
+        'user_id': post.user_id,
+    }
+    if content:
+        data['content'] = post.content
+    if 'author' in embed:
+        data['author'] = user_json(post.author)
+    if 'images' in embed:
+        data['images'] = [image_json(image, image_url, image_srcset) for image in post.images]
+    if 'comments' in embed:
+        data['comments'] = [comment_json(comment) for comment in comments or ()]
+    return data
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Запуск приложения в production-режиме через Gunicorn"""
+from gunicorn.app.base import BaseApplication
+
+
+def server_options(app, **overrides):
+    """Настройки Gunicorn из конфигурации приложения
+
+    Args:
+        app (Flask): Приложение
+        **overrides: Значения, заданные в командной строке (None пропускаются)
+
+    Returns:
+        dict: Настройки Gunicorn
+    """
+    config = app.config
+    options = {
+        'bind': config['SERVER_BIND'],
+        'workers': config['SERVER_WORKERS'],
+        'threads': config['SERVER_THREADS'],
+        'worker_class': 'gthread',
+        'keepalive': config['SERVER_KEEPALIVE'],
+        'timeout': config['SERVER_TIMEOUT'],
+        'graceful_timeout': config['SERVER_GRACEFUL_TIMEOUT'],
+        'max_requests': config['SERVER_MAX_REQUESTS'],
+        'max_requests_jitter': config['SERVER_MAX_REQUESTS'] // 10,
+        'accesslog': config['SERVER_ACCESS_LOG'],
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+class ForumServer(BaseApplication):
+    """Gunicorn-приложение с рабочими процессами gthread
+
+    Каждый процесс обслуживает несколько потоков и keep-alive соединений.
+    Сигнал HUP мастер-процессу плавно заменяет рабочие процессы: старые
+    дообслуживают текущие запросы в пределах graceful_timeout. Приложение
+    создаётся в мастер-процессе и наследуется рабочими при fork, поэтому
+    HUP не загружает изменённый код — для обновления сервер перезапускается.
+    """
+
+    def __init__(self, app, options, on_fork=None):
+        self.application = app
+        self.options = options
+        self.on_fork = on_fork
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+        if self.on_fork is not None:
+            on_fork = self.on_fork
+            self.cfg.set('post_fork', lambda server, worker: on_fork())
+
+    def load(self):
+        return self.application
+
+
+def serve(app, on_fork=None, **overrides):
+    """Запуск Gunicorn с приложением
+
+    Args:
+        app (Flask): Приложение
+        on_fork (callable, optional): Вызывается в каждом рабочем процессе после fork
+        **overrides: Настройки, переопределяющие конфигурацию
+    """
+    ForumServer(app, server_options(app, **overrides), on_fork=on_fork).run()
+
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name="game-forum",
     version="1.0.0",
-    py_modules=['app'],
+    py_modules=['app', 'config', 'search', 'querycount', 'viewcounter', 'pagination', 'queryplan', 'pagecache', 'images', 'storage', 'server', 'dbconfig', 'ratelimit', 'usercache', 'facets', 'metrics', 'httpcache', 'serializers', 'jobs'],
     include_package_data=True,
     install_requires=[
         'Flask>=2.0.1',
@@ -11,7 +11,13 @@ setup(
         'Flask-Login>=0.5.0',
         'Flask-Migrate>=3.1.0',
         'Werkzeug>=2.0.1',
+        'Pillow>=10.0.0',
+        'gunicorn>=21.2.0',
     ],
+    extras_require={
+        'brotli': ['Brotli>=1.0.9'],
+        'test': ['pytest>=7.0'],
+    },
     entry_points={
         'console_scripts':[
             'game-forum=app:main'
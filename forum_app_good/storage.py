@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Хранилище загрузок с адресацией по содержимому и потоковый приём файлов"""
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+CHUNK_SIZE = 64 * 1024
+TMP_PREFIX = '.upload-'
+# Сигнатуры форматов изображений: префикс файла и расширение хранимого файла
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+HEAD_SIZE = max(len(signature) for signature, _ in SIGNATURES)
+
+
+class InvalidUpload(ValueError):
+    """Содержимое загрузки не соответствует допустимому формату"""
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """Загруженный файл или запрос превышает допустимый размер"""
+
+
+def sniff_extension(head):
+    """Определение формата изображения по первым байтам
+
+    Args:
+        head (bytes): Начало файла
+
+    Returns:
+        str: Расширение формата или None, если формат не распознан
+    """
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+class UploadFile:
+    """Файл загрузки, который пишется напрямую в каталог хранилища
+
+    Используется Werkzeug как поток для частей multipart-запроса: данные
+    пишутся во временный файл по мере чтения запроса, одновременно
+    считается SHA-256, а формат определяется по первым байтам. Если
+    сигнатура не распознана, остаток файла на диск не пишется. Превышение
+    max_size прерывает разбор запроса. Незафиксированный файл удаляется
+    при закрытии.
+    """
+
+    def __init__(self, folder, max_size=None):
+        # Каталог создаётся при первой загрузке, а не при запуске приложения
+        os.makedirs(folder, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=TMP_PREFIX, dir=folder)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self.folder = folder
+        self.max_size = max_size
+        self.size = 0
+        self.extension = None
+        self.rejected = False
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise UploadTooLarge()
+        if self.rejected:
+            return len(data)
+        if len(self._head) < HEAD_SIZE:
+            self._head += data[:HEAD_SIZE - len(self._head)]
+            if len(self._head) == HEAD_SIZE:
+                self._sniff()
+                if self.rejected:
+                    return len(data)
+        self._digest.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def _sniff(self):
+        self.extension = sniff_extension(self._head)
+        self.rejected = self.extension is None
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def commit(self, allowed_extensions):
+        """Перемещение файла под постоянное имя <sha256>.<расширение>
+
+        Args:
+            allowed_extensions (set): Допустимые расширения
+
+        Returns:
+            str: Имя файла в каталоге хранилища
+
+        Raises:
+            InvalidUpload: Если формат не распознан или не разрешён
+        """
+        if self.extension is None and not self.rejected:
+            self._sniff()
+        if self.rejected or self.extension not in allowed_extensions:
+            raise InvalidUpload(self.extension)
+        self._file.close()
+        filename = f'{self._digest.hexdigest()}.{self.extension}'
+        path = os.path.join(self.folder, filename)
+        if os.path.exists(path):
+            os.remove(self.path)
+        else:
+            os.chmod(self.path, 0o644)
+            os.replace(self.path, path)
+        self.committed = True
+        return filename
+
+    def close(self):
+        self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+
+class UploadRequest(Request):
+    """Запрос, который пишет загружаемые файлы сразу в каталог хранилища
+
+    Размер каждого файла ограничен ``UPLOAD_MAX_FILE_SIZE``, число файлов —
+    ``UPLOAD_MAX_FILES``, размер всего запроса — стандартной настройкой
+    ``MAX_CONTENT_LENGTH`` (запрос с большим Content-Length отклоняется
+    до чтения тела).
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        uploads = self.__dict__.setdefault('_uploads', [])
+        if len(uploads) >= config['UPLOAD_MAX_FILES']:
+            raise UploadTooLarge()
+        upload = UploadFile(config['UPLOAD_FOLDER'], config['UPLOAD_MAX_FILE_SIZE'])
+        uploads.append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        for upload in self.__dict__.pop('_uploads', ()):
+            upload.close()
+
+
+class StreamingUploads:
+    """Расширение Flask, включающее потоковый приём загрузок"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Подключение к приложению
+
+        Args:
+            app (Flask): Приложение
+        """
+        # Файлы раздаются как статика: uploads/<имя> внутри каталога static
+        app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.static_folder, 'uploads'))
+        app.config.setdefault('UPLOAD_MAX_FILE_SIZE', 10 * 1024 * 1024)
+        app.config.setdefault('UPLOAD_MAX_FILES', 10)
+        app.request_class = UploadRequest
+        app.extensions['streaming_uploads'] = self
+
+
+def save_upload(stream, folder, allowed_extensions):
+    """Сохранение загрузки под именем, равным SHA-256 её содержимого
+
+    Поток UploadFile уже лежит в каталоге хранилища и просто фиксируется;
+    любой другой поток сначала копируется блоками. Если такой файл уже
+    есть, копия удаляется и возвращается имя существующего.
+
+    Args:
+        stream: Файловый поток загрузки
+        folder (str): Каталог загрузок
+        allowed_extensions (set): Допустимые расширения
+
+    Returns:
+        str: Имя сохранённого файла
+
+    Raises:
+        InvalidUpload: Если содержимое не является изображением допустимого формата
+    """
+    if isinstance(stream, UploadFile):
+        return stream.commit(allowed_extensions)
+    upload = UploadFile(folder)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+        return upload.commit(allowed_extensions)
+    finally:
+        upload.close()
+
+
+def find_orphans(folder, referenced, variant_stem, min_age=3600):
+    """Поиск файлов в каталоге загрузок, на которые не ссылается ни одна запись
+
+    Файлы моложе min_age секунд пропускаются: их запись в базе может быть
+    ещё не зафиксирована.
+
+    Args:
+        folder (str): Каталог загрузок
+        referenced (set): Имена файлов, на которые есть ссылки
+        variant_stem (callable): Возвращает имя исходного файла без расширения
+            для файла-варианта или None для остальных файлов
+        min_age (float): Минимальный возраст файла в секундах
+
+    Returns:
+        list: Имена файлов-сирот
+    """
+    now = time.time()
+    referenced_stems = {os.path.splitext(name)[0] for name in referenced}
+    orphans = []
+    if not os.path.isdir(folder):
+        return orphans
+    for entry in os.scandir(folder):
+        if not entry.is_file():
+            continue
+        if now - entry.stat().st_mtime < min_age:
+            continue
+        stem = variant_stem(entry.name)
+        if stem is not None:
+            if stem not in referenced_stems:
+                orphans.append(entry.name)
+        elif entry.name not in referenced:
+            orphans.append(entry.name)
+    return sorted(orphans)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Общие фикстуры тестов: приложение профиля testing с базой в памяти"""
+import pytest
+
+from app import create_app, create_test_data, db, view_counter
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Приложение с тестовыми данными; файловые хранилища — во временном каталоге"""
+    application = create_app(
+        'testing',
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        PAGE_CACHE_DIR=str(tmp_path / 'page_cache'),
+        RATE_LIMIT_PATH=str(tmp_path / 'ratelimit.db'),
+        JOB_QUEUE_PATH=str(tmp_path / 'jobs.db'),
+        METRICS_DB_PATH=str(tmp_path / 'metrics.db'),
+    )
+    with application.app_context():
+        db.create_all()
+    create_test_data(application)
+    yield application
+    # Буфер просмотров записывается до удаления таблиц, а не при выходе из процесса
+    view_counter.flush()
+    with application.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Сортировки и поиск торговой площадки"""
+import re
+
+import pytest
+
+from app import Post, User, db
+
+
+@pytest.fixture
+def listings(app):
+    """Товары с ценами и один без цены"""
+    with app.app_context():
+        seller = User.query.filter_by(username='gamer1').one()
+        for title, price in [('Нож 900', 900), ('Нож 500', 500), ('Нож без цены', None), ('Нож 10', 10), ('Нож 50', 50)]:
+            db.session.add(Post(title=title, content='товар', section='marketplace', price=price, user_id=seller.id))
+        db.session.commit()
+
+
+def listed_titles(client, url):
+    with client.application.app_context():
+        response = client.get(url)
+    assert response.status_code == 200
+    return re.findall(r'Нож (?:\d+|без цены)', response.get_data(as_text=True))
+
+
+@pytest.mark.usefixtures('listings')
+@pytest.mark.parametrize('sort, expected', [
+    ('price_asc', ['Нож 10', 'Нож 50', 'Нож 500', 'Нож 900', 'Нож без цены']),
+    ('price_desc', ['Нож 900', 'Нож 500', 'Нож 50', 'Нож 10', 'Нож без цены']),
+])
+def test_price_sort_puts_unpriced_last(client, sort, expected):
+    # На странице 5 товаров, поиск оставляет только ножи
+    assert listed_titles(client, f'/marketplace?sort={sort}&search=нож')[:5] == expected
+
+
+@pytest.mark.usefixtures('listings')
+def test_price_sort_without_search(client):
+    assert listed_titles(client, '/marketplace?sort=price_asc') == ['Нож 10', 'Нож 50', 'Нож 500', 'Нож 900']
+    assert listed_titles(client, '/marketplace?sort=price_asc&page=2') == ['Нож без цены']
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Бюджеты SQL-запросов страниц (QUERY_BUDGETS) в профиле testing"""
+import pytest
+
+from app import sample_page_requests
+from querycount import QueryBudgetExceeded
+
+
+def test_sample_pages_stay_within_budgets(app):
+    with app.app_context():
+        requests = sample_page_requests(app.test_client())
+    # Курсорные страницы лент тоже должны попасть в проверку
+    assert any('after=' in url for url, _ in requests)
+
+    over_budget = []
+    for url, perform in requests:
+        try:
+            response = perform()
+        except QueryBudgetExceeded as e:
+            over_budget.append(f'{url}: {e}')
+            continue
+        assert response.status_code == 200, url
+        assert 'X-Query-Count' in response.headers, url
+    assert not over_budget, '\n'.join(over_budget)
+
+
+def test_exceeded_budget_fails_request(app, client):
+    app.config['QUERY_BUDGETS'] = dict(app.config['QUERY_BUDGETS'], **{'main.index': 0})
+    with app.app_context(), pytest.raises(QueryBudgetExceeded):
+        client.get('/')
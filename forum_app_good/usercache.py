@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Кеш пользователей для Flask-Login: запрос к БД только при промахе"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+
+
+class CachedUser(UserMixin):
+    """Лёгкая запись пользователя для current_user: только id и имя
+
+    Шаблоны и представления используют у текущего пользователя лишь эти
+    поля, поэтому ORM-объект с отношениями для каждого запроса не нужен.
+    """
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def __repr__(self):
+        return f'<CachedUser {self.id} {self.username}>'
+
+
+class UserCache:
+    """Расширение Flask: ограниченный LRU со сроком жизни записей для user_loader
+
+    Размер задаётся ``USER_CACHE_SIZE``, срок жизни — ``USER_CACHE_TTL``
+    (0 отключает кеш). Кеш локален для процесса: изменения пользователя
+    сбрасывают запись в текущем процессе сразу, в остальных — не позже TTL.
+    У каждого приложения свой набор записей: одинаковые ID в разных базах
+    не смешиваются.
+    """
+
+    def __init__(self, app=None, loader=None):
+        self.loader = loader
+        self._entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app, loader)
+
+    def init_app(self, app, loader=None):
+        """Подключение кеша к приложению
+
+        Args:
+            app (Flask): Приложение
+            loader (callable, optional): Загружает CachedUser по ID или возвращает None
+        """
+        app.config.setdefault('USER_CACHE_TTL', 300)
+        app.config.setdefault('USER_CACHE_SIZE', 1024)
+        self.loader = loader or self.loader
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id):
+        """Пользователь по ID из кеша или через loader
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            CachedUser: Пользователь или None, если не найден
+        """
+        config = current_app.config
+        ttl = config['USER_CACHE_TTL']
+        if not ttl:
+            return self.loader(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._app_entries()
+            entry = entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        user = self.loader(user_id)
+        # Отсутствующих пользователей не кешируем, чтобы не держать мусорные ID
+        if user is not None:
+            with self._lock:
+                entries = self._app_entries()
+                entries[user_id] = (now + ttl, user)
+                entries.move_to_end(user_id)
+                while len(entries) > config['USER_CACHE_SIZE']:
+                    entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        """Удаление пользователя из кеша
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        with self._lock:
+            self._app_entries().pop(user_id, None)
+
+    def clear(self):
+        """Очистка кеша текущего приложения"""
+        with self._lock:
+            self._app_entries().clear()
+
+    def _app_entries(self):
+        # Вызывается под self._lock
+        app = current_app._get_current_object()
+        entries = self._entries.get(app)
+        if entries is None:
+            entries = self._entries[app] = OrderedDict()
+        return entries
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Буферизованный счётчик просмотров постов"""
+import atexit
+import os
+import threading
+from collections import Counter, defaultdict
+
+from flask import current_app
+from sqlalchemy import bindparam, func, update
+
+
+class ViewCounter:
+    """Расширение Flask, накапливающее просмотры в памяти процесса
+
+    Вместо транзакции на каждый просмотр счётчики копятся в буфере и
+    записываются в таблицу пачкой — по таймеру
+    (``VIEW_COUNTER_FLUSH_INTERVAL``, секунды), при достижении порога
+    (``VIEW_COUNTER_FLUSH_THRESHOLD`` просмотров) и при завершении процесса.
+
+    Запись выполняется как ``views = views + n``, поэтому несколько
+    процессов-воркеров с собственными буферами не затирают друг друга.
+    Просмотры учитываются вместе с приложением, в котором они произошли,
+    и записываются в базу этого приложения.
+    """
+
+    def __init__(self, app=None, db=None, model=None):
+        self.db = db
+        self.model = model
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._total = 0
+        self._pid = os.getpid()
+        self._worker = None
+        self._stop = threading.Event()
+        atexit.register(self.shutdown)
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db=None, model=None):
+        """Подключение счётчика к приложению
+
+        Args:
+            app (Flask): Приложение
+            db (SQLAlchemy): Объект базы данных
+            model: Модель с колонками ``id`` и ``views``
+        """
+        self.db = db or self.db
+        self.model = model or self.model
+        app.config.setdefault('VIEW_COUNTER_FLUSH_INTERVAL', 5.0)
+        app.config.setdefault('VIEW_COUNTER_FLUSH_THRESHOLD', 100)
+        app.extensions['view_counter'] = self
+
+    def hit(self, post_id):
+        """Учёт одного просмотра поста
+
+        Args:
+            post_id (int): ID поста
+        """
+        self._check_fork()
+        app = current_app._get_current_object()
+        with self._lock:
+            self._pending[app, post_id] += 1
+            self._total += 1
+            total = self._total
+        self._ensure_worker(app.config['VIEW_COUNTER_FLUSH_INTERVAL'])
+        if total >= app.config['VIEW_COUNTER_FLUSH_THRESHOLD']:
+            self.flush()
+
+    def pending(self, post_id):
+        """Количество ещё не записанных просмотров поста в этом процессе
+
+        Args:
+            post_id (int): ID поста
+
+        Returns:
+            int: Число буферизованных просмотров
+        """
+        with self._lock:
+            return self._pending.get((current_app._get_current_object(), post_id), 0)
+
+    def flush(self):
+        """Запись накопленных просмотров в базу одной транзакцией на приложение
+
+        При ошибке записи просмотры возвращаются в буфер.
+
+        Returns:
+            int: Количество обновлённых постов
+        """
+        self._check_fork()
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            self._total = 0
+        if not batch:
+            return 0
+
+        by_app = defaultdict(dict)
+        for (app, post_id), hits in batch.items():
+            by_app[app][post_id] = hits
+
+        table = self.model.__table__
+        statement = update(table).where(table.c.id == bindparam('post_id')).values(
+            views=func.coalesce(table.c.views, 0) + bindparam('hits')
+        )
+        updated = 0
+        for app, hits_by_post in by_app.items():
+            try:
+                with app.app_context():
+                    with self.db.engine.begin() as connection:
+                        connection.execute(
+                            statement,
+                            [{'post_id': post_id, 'hits': hits} for post_id, hits in hits_by_post.items()]
+                        )
+            except Exception:
+                with self._lock:
+                    self._pending.update({(app, post_id): hits for post_id, hits in hits_by_post.items()})
+                    self._total += sum(hits_by_post.values())
+                app.logger.exception('Не удалось записать счётчики просмотров')
+                continue
+            updated += len(hits_by_post)
+        return updated
+
+    def shutdown(self):
+        """Остановка фонового потока и запись оставшихся просмотров"""
+        self._stop.set()
+        self.flush()
+
+    def _check_fork(self):
+        """Сброс состояния, унаследованного от родительского процесса"""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._pending = Counter()
+            self._total = 0
+            self._worker = None
+            self._stop = threading.Event()
+
+    def _ensure_worker(self, interval):
+        """Ленивый запуск фонового потока периодической записи"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._run, args=(interval,), name='view-counter-flush', daemon=True
+            )
+            self._worker.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.flush()